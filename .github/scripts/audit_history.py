@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Histórico append-only dos snapshots do org_audit.py.
+
+Layout (um diretório por org, partição por ano):
+
+  <root>/<slug>/runs.ndjson                      1 linha por run: totais + arquivo
+  <root>/<slug>/<YYYY>/<YYYY-MM-DDTHHMMSSZ>.ndjson.gz
+                                                 1 linha por repo, só escalares,
+                                                 branches como {nome: {sha, since, ...}}
+
+Nada é reescrito: cada run só acrescenta um arquivo e uma linha em runs.ndjson.
+"since" é a data do primeiro run em que a branch apareceu com aquele SHA
+(herdado do run anterior), então branches paradas saem só do último snapshot,
+e o diff de um run só precisa do snapshot anterior.
+
+  python .github/scripts/audit_history.py runs   <slug>
+  python .github/scripts/audit_history.py trend  <slug> [--metric total_files] [--repo NAME]
+  python .github/scripts/audit_history.py diff   <slug>
+  python .github/scripts/audit_history.py stale  <slug> [--days 90]
+"""
+import argparse
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# campos do org-audit que não entram no histórico (derivados ou repetidos)
+SKIP_REPO_KEYS = {"org", "url", "full_name", "branches", "detail"}
+SKIP_BRANCH_KEYS = {"branch", "head_sha"}
+
+# métricas por repo comparadas no diff
+DIFF_METRICS = ("total_files", "notebooks_ipynb", "files_py", "files_tex", "files_md", "branches_count")
+
+
+def _scalars(d: Dict[str, Any], skip: set) -> Dict[str, Any]:
+    return {k: v for k, v in d.items() if k not in skip and isinstance(v, (bool, int, float, str))}
+
+
+def run_id_for(at: datetime) -> str:
+    return at.strftime("%Y-%m-%dT%H%M%SZ")
+
+
+class AuditHistory:
+    def __init__(self, root: str):
+        self.root = root
+
+    def runs(self, slug: str) -> List[Dict[str, Any]]:
+        """Entradas de runs.ndjson, da mais antiga pra mais nova."""
+        path = os.path.join(self.root, slug, "runs.ndjson")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def append(self, slug: str, rows: Iterable[Dict[str, Any]], at: datetime) -> Dict[str, Any]:
+        """
+        Grava o snapshot de um run (rows no formato do org-audit.json) e
+        acrescenta a linha em runs.ndjson. Lê só o snapshot anterior (pra "since").
+        """
+        prev_runs = self.runs(slug)
+        prev = self.load(slug, prev_runs[-1]["run"]) if prev_runs else {}
+
+        run = run_id_for(at)
+        day = at.strftime("%Y-%m-%d")
+        rel = os.path.join(at.strftime("%Y"), f"{run}.ndjson.gz")
+        path = os.path.join(self.root, slug, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        totals: Dict[str, Any] = {"repos": 0, "archived": 0, "branches": 0}
+        with gzip.open(f"{path}.tmp", "wt", encoding="utf-8", compresslevel=9) as f:
+            for r in rows:
+                rec = _scalars(r, SKIP_REPO_KEYS)
+                old_branches = prev.get(rec.get("name"), {}).get("branches", {})
+                branches = {}
+                for b in r.get("branches", []):
+                    old = old_branches.get(b["branch"])
+                    sha = b.get("head_sha")
+                    since = old["since"] if old and old.get("sha") == sha else day
+                    branches[b["branch"]] = {"sha": sha, "since": since, **_scalars(b, SKIP_BRANCH_KEYS)}
+                rec["branches"] = branches
+                f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+                totals["repos"] += 1
+                totals["archived"] += 1 if rec.get("archived") else 0
+                totals["branches"] += len(branches)
+                for k, v in rec.items():
+                    if isinstance(v, (int, float)) and not isinstance(v, bool):
+                        totals[k] = totals.get(k, 0) + v
+        os.replace(f"{path}.tmp", path)
+
+        entry = {"run": run, "at": at.isoformat() + "Z", "file": rel.replace(os.sep, "/"), **totals}
+        with open(os.path.join(self.root, slug, "runs.ndjson"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        return entry
+
+    def _path(self, slug: str, run: str) -> str:
+        return os.path.join(self.root, slug, run[:4], f"{run}.ndjson.gz")
+
+    def iter_run(self, slug: str, run: str) -> Iterator[Dict[str, Any]]:
+        with gzip.open(self._path(slug, run), "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def load(self, slug: str, run: str) -> Dict[str, Dict[str, Any]]:
+        """Snapshot de um run: {repo: registro}."""
+        return {rec["name"]: rec for rec in self.iter_run(slug, run)}
+
+    def trend(self, slug: str, metric: str = "total_files", repo: Optional[str] = None) -> List[Tuple[str, Any]]:
+        """
+        [(at, valor)] por run. Sem repo usa os totais de runs.ndjson (não abre
+        snapshot nenhum); com repo lê um snapshot por run, em streaming.
+        """
+        out = []
+        for entry in self.runs(slug):
+            if repo is None:
+                out.append((entry["at"], entry.get(metric)))
+                continue
+            value = None
+            for rec in self.iter_run(slug, entry["run"]):
+                if rec.get("name") == repo:
+                    value = rec.get(metric)
+                    break
+            out.append((entry["at"], value))
+        return out
+
+    def diff(self, slug: str, old_run: Optional[str] = None, new_run: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Diff entre dois runs (default: os dois últimos); None se só houver um."""
+        runs = [e["run"] for e in self.runs(slug)]
+        new_run = new_run or (runs[-1] if runs else None)
+        if old_run is None and new_run in runs:
+            i = runs.index(new_run)
+            old_run = runs[i - 1] if i > 0 else None
+        if not old_run or not new_run:
+            return None
+        return diff_snapshots(self.load(slug, old_run), self.load(slug, new_run), old_run, new_run)
+
+    def stale_branches(self, slug: str, days: int = 90, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Branches (não default) com o mesmo SHA há pelo menos `days` dias, no último run."""
+        runs = self.runs(slug)
+        if not runs:
+            return []
+        now = now or datetime.utcnow()
+        out = []
+        for rec in self.iter_run(slug, runs[-1]["run"]):
+            for name, b in rec.get("branches", {}).items():
+                if name == rec.get("default_branch"):
+                    continue
+                age = (now - datetime.strptime(b["since"], "%Y-%m-%d")).days
+                if age >= days:
+                    out.append({"repo": rec["name"], "branch": name, "sha": b.get("sha"), "since": b["since"], "days": age})
+        out.sort(key=lambda x: -x["days"])
+        return out
+
+
+def diff_snapshots(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]],
+                   old_run: str = "", new_run: str = "") -> Dict[str, Any]:
+    out: Dict[str, Any] = {
+        "from": old_run,
+        "to": new_run,
+        "repos_added": sorted(set(new) - set(old)),
+        "repos_removed": sorted(set(old) - set(new)),
+        "archived": [],
+        "unarchived": [],
+        "branches_added": [],
+        "branches_removed": [],
+        "branches_moved": [],
+        "changed": {},
+    }
+    for name in sorted(set(old) & set(new)):
+        o, n = old[name], new[name]
+        if n.get("archived") and not o.get("archived"):
+            out["archived"].append(name)
+        if o.get("archived") and not n.get("archived"):
+            out["unarchived"].append(name)
+
+        ob, nb = o.get("branches", {}), n.get("branches", {})
+        out["branches_added"] += [[name, b] for b in sorted(set(nb) - set(ob))]
+        out["branches_removed"] += [[name, b] for b in sorted(set(ob) - set(nb))]
+        out["branches_moved"] += [
+            [name, b, ob[b].get("sha"), nb[b].get("sha")]
+            for b in sorted(set(ob) & set(nb)) if ob[b].get("sha") != nb[b].get("sha")
+        ]
+
+        changed = {m: [o.get(m), n.get(m)] for m in DIFF_METRICS if o.get(m) != n.get(m)}
+        if changed:
+            out["changed"][name] = changed
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("cmd", choices=["runs", "trend", "diff", "stale"])
+    ap.add_argument("slug")
+    ap.add_argument("--root", default=os.environ.get("AUDIT_HISTORY_DIR", os.path.join("reports", "history")))
+    ap.add_argument("--metric", default="total_files")
+    ap.add_argument("--repo")
+    ap.add_argument("--days", type=int, default=90)
+    args = ap.parse_args()
+
+    h = AuditHistory(args.root)
+    if args.cmd == "runs":
+        result: Any = h.runs(args.slug)
+    elif args.cmd == "trend":
+        result = h.trend(args.slug, args.metric, args.repo)
+    elif args.cmd == "diff":
+        result = h.diff(args.slug)
+    else:
+        result = h.stale_branches(args.slug, args.days)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
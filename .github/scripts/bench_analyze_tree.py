@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark do analyze_tree em árvores sintéticas grandes.
+
+Compara com a versão antiga (uma passada com endswith por extensão, sem
+bytes) e confere que os contadores em comum batem. --extra-exts N
+acrescenta N extensões configuradas: na versão antiga cada uma custa uma
+passada a mais; na nova é só mais uma chave no lookup.
+
+  python .github/scripts/bench_analyze_tree.py --entries 1000000 --extra-exts 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+EXTS = [".py", ".ipynb", ".md", ".tex", ".yml", ".yaml", ".json", ".txt", ".png", ".csv", ""]
+EXTRA = [".json", ".txt", ".png", ".csv", ".r", ".jl", ".h5", ".pdf", ".zip", ".cpp", ".f90", ".sh"]
+
+
+def synthetic_tree(entries: int, seed: int = 0):
+    rnd = random.Random(seed)
+    tree = [{"path": ".gitignore", "type": "blob", "size": 10},
+            {"path": "README.md", "type": "blob", "size": 100}]
+    for i in range(entries - 2):
+        if i % 20 == 0:
+            tree.append({"path": f"pkg{i % 997}/sub{i}", "type": "tree"})
+            continue
+        ext = rnd.choice(EXTS)
+        tree.append({
+            "path": f"pkg{i % 997}/sub{i % 31}/File_{i}{ext}",
+            "type": "blob",
+            "size": int(rnd.paretovariate(1.2) * 1000),
+        })
+    return tree
+
+
+def legacy_analyze_tree(tree, extra=()):
+    paths = [n.get("path", "") for n in tree if n.get("type") == "blob"]
+    lower = [p.lower() for p in paths]
+    for ext in extra:
+        sum(1 for p in lower if p.endswith(ext))
+    return {
+        "has_gitignore": ".gitignore" in lower,
+        "has_readme": any(p.startswith("readme") for p in lower),
+        "notebooks_ipynb": sum(1 for p in lower if p.endswith(".ipynb")),
+        "files_py": sum(1 for p in lower if p.endswith(".py")),
+        "files_tex": sum(1 for p in lower if p.endswith(".tex")),
+        "files_md": sum(1 for p in lower if p.endswith(".md")),
+        "files_yml": sum(1 for p in lower if p.endswith(".yml") or p.endswith(".yaml")),
+        "total_files": len(paths),
+    }
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--extra-exts", type=int, default=0, choices=range(len(EXTRA) + 1))
+    args = ap.parse_args()
+
+    extra = EXTRA[:args.extra_exts]
+    os.environ.setdefault("ORGS", "bench")
+    os.environ.setdefault("GH_TOKEN", "bench")
+    os.environ["AUDIT_EXT_BUCKETS"] = json.dumps({e: f"files_{e[1:]}" for e in extra})
+    os.chdir(tempfile.mkdtemp(prefix="analyze-tree-bench-"))
+    import org_audit
+
+    tree = synthetic_tree(args.entries)
+    t_old, old = best_of(lambda t: legacy_analyze_tree(t, extra), tree, args.repeat)
+    t_new, new = best_of(org_audit.analyze_tree, tree, args.repeat)
+    # repos com mais de um head SHA: + path_sets pra união das branches
+    t_sets, with_sets = best_of(lambda t: org_audit.analyze_tree(t, path_sets=True), tree, args.repeat)
+    t_union, union = best_of(lambda ps: org_audit.unique_stats([ps, ps]), with_sets["path_sets"], args.repeat)
+
+    same = all(new[k] == v for k, v in old.items())
+    print(f"entries={len(tree)} blobs={new['total_files']} bytes={new['total_bytes']}")
+    print(f"  legacy ({6 + len(extra)} passes): {t_old * 1000:8.1f} ms")
+    print(f"  single pass      : {t_new * 1000:8.1f} ms  ({len(org_audit.BUCKET_KEYS)} buckets, "
+          f"+bytes, largest files, lfs candidates)")
+    print(f"  ratio            : {t_old / t_new:.2f}x   counters match: {same}")
+    packed = sum(len(v) for v in with_sets["path_sets"].values())
+    print(f"  + path_sets      : {t_sets * 1000:8.1f} ms  ({packed / 1024:.0f} KB packed)")
+    print(f"  unique_stats x2  : {t_union * 1000:8.1f} ms  (unique_total_files={union['unique_total_files']})")
+    same = same and union["unique_total_files"] == new["total_files"]
+    print(f"  largest: {new['largest_files'][:3]}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
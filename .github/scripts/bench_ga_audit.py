@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark do ga_audit_usage.py com um client GA4 falso (latência fixa por chamada).
+
+Três runs sobre as mesmas orgs:
+  - sequential: 5 run_report por property, uma org por vez, store vazio
+  - batch:      batch_run_reports + orgs em paralelo, store vazio
+  - warm:       igual ao batch, com o store do run anterior (só os dias não finais)
+e confere que os ga-usage*.json saem iguais nos três.
+
+  python .github/scripts/bench_ga_audit.py --orgs 6 --paths 100 --latency 0.3 --parallel 4
+  python .github/scripts/bench_ga_audit.py --paths 200 --page-size 5000   # força paginação
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+import ga_audit_usage as ga  # noqa: E402
+from mock_ga import StubClient  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orgs", type=int, default=6)
+    ap.add_argument("--paths", type=int, default=100)
+    ap.add_argument("--latency", type=float, default=0.3, help="seconds per GA API call")
+    ap.add_argument("--parallel", type=int, default=4)
+    ap.add_argument("--page-size", type=int, default=0, help="GA_PAGE_SIZE override (0 = default)")
+    args = ap.parse_args()
+
+    if args.page_size:
+        ga.GA_PAGE_SIZE = args.page_size
+
+    orgs = [f"bench-org-{i}" for i in range(args.orgs)]
+    for i, org in enumerate(orgs):
+        os.environ[f"GA_PROPERTY_ID_{ga.norm_org_to_env(org)}"] = str(100000 + i)
+    work = Path(tempfile.mkdtemp(prefix="ga-audit-bench-"))
+    os.chdir(work)
+    today = date.today()
+
+    runs = (
+        ("sequential", 1, False, "seq.sqlite"),
+        (f"batch x{args.parallel}", args.parallel, True, "batch.sqlite"),
+        ("warm", args.parallel, True, "batch.sqlite"),
+    )
+    results = {}
+    for label, parallel, batch, store in runs:
+        client = StubClient(args.paths, args.latency)
+        t0 = time.perf_counter()
+        ga.audit_orgs(client, orgs, parallel=parallel, use_batch=batch, store_path=str(work / store), today=today)
+        dt = time.perf_counter() - t0
+        outputs = {}
+        for o in orgs:
+            for f in sorted((ga.REPORTS / o).glob("ga-usage*.json")):
+                out = json.loads(f.read_text())
+                out.pop("data_quality", None)  # depende do que foi buscado neste run
+                outputs[(o, f.name)] = out
+        results[label] = (dt, outputs)
+        print(f"{label:>14}: {dt:7.2f}s  calls={dict(client.calls)}")
+
+    (t_seq, out_seq), (t_new, out_new), (t_warm, out_warm) = results.values()
+    same = out_seq == out_new == out_warm
+    print(f"{'identical':>14}: {same}")
+    print(f"{'speedup':>14}: batch {t_seq / t_new:.1f}x, warm {t_seq / t_warm:.1f}x")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
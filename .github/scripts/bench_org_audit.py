@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark do org_audit.py contra o mock local (mock_github.py).
+
+Roda o mesmo crawl com concorrência 1 (sequencial) e com N, confere que
+as linhas geradas são idênticas e mostra o speedup.
+
+  python .github/scripts/bench_org_audit.py --repos 30 --branches 4 --latency 0.02 --inflight 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+from mock_github import MockGitHub, synthetic_org  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repos", type=int, default=30)
+    ap.add_argument("--branches", type=int, default=4)
+    ap.add_argument("--files", type=int, default=50)
+    ap.add_argument("--latency", type=float, default=0.02, help="seconds per mocked request")
+    ap.add_argument("--inflight", type=int, default=8, help="max in-flight requests (per org and global)")
+    args = ap.parse_args()
+
+    fixture = synthetic_org("bench-org", args.repos, args.branches, args.files)
+    mock = MockGitHub([fixture], latency=args.latency)
+    base_url = mock.start()
+
+    # org_audit lê o env no import (relatórios e caches só são gravados ao rodar)
+    os.environ["ORGS"] = "bench-org"
+    os.environ["GH_TOKEN"] = "mock"
+    os.environ["GH_API_URL"] = base_url
+    os.environ["AUDIT_CACHE_DIR"] = ""
+    os.chdir(tempfile.mkdtemp(prefix="org-audit-bench-"))
+    import org_audit
+
+    results = {}
+    try:
+        for label, n in (("sequential", 1), (f"concurrent x{args.inflight}", args.inflight)):
+            org_audit.set_max_inflight(n, n)
+            org_audit.TREE_CACHE = org_audit.ShaCache(None)
+            org_audit.LATENCY = org_audit.LatencyStats()
+            mock.counts.clear()
+            t0 = time.perf_counter()
+            rows = org_audit.audit_one_org("bench-org")
+            dt = time.perf_counter() - t0
+            results[label] = (dt, rows, sum(mock.counts.values()))
+            print(f"{label:>16}: {dt:7.2f}s  requests={sum(mock.counts.values())}  {dict(mock.counts)}")
+            print(f"{'':>16}  tree-cache {org_audit.TREE_CACHE.summary()}")
+            print(f"{'':>16}  latency {org_audit.LATENCY.summary()}")
+    finally:
+        mock.stop()
+
+    (t_seq, rows_seq, _), (t_par, rows_par, _) = results.values()
+    same = rows_seq == rows_par
+    print(f"{'identical rows':>16}: {same}")
+    print(f"{'speedup':>16}: {t_seq / t_par:.1f}x")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
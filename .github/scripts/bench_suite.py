@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Suíte de benchmark do org_audit.py e do ga_audit_usage.py, sem credenciais.
+
+Cada cenário roda num processo filho (pico de memória via os.wait4) contra
+o mock local do GitHub (mock_github.py) ou um client GA falso (mock_ga.py):
+
+  replay:<slug>          org_audit com as respostas reconstruídas de reports_/<slug>/org-audit.json;
+                         confere que os contadores saem iguais aos gravados
+  ga-replay:<slug>       ga_audit_usage com reports_/<slug>/ga-usage.json; confere o metrics_by_path
+  synthetic:<R>x<B>      org_audit numa org sintética com R repos e B branches por repo; confere
+                         branches, contadores e unique_* contra as árvores geradas
+  git:<R>x<B>            a mesma org com AUDIT_TREE_BACKEND=git, clonando de repos bare locais
+  ga-synthetic:<P>       ga_audit_usage com P paths sintéticos por dia
+
+Mede wall time, requests (HTTP no mock / chamadas GA) e pico de RSS.
+--out grava o resultado em JSON; --baseline compara com um resultado anterior
+e sai com erro se algum cenário falhar ou regredir.
+
+  python .github/scripts/bench_suite.py                          # preset quick
+  python .github/scripts/bench_suite.py --preset scale           # até 10k repos / 100k branches
+  python .github/scripts/bench_suite.py synthetic:500x4 --out before.json
+  python .github/scripts/bench_suite.py synthetic:500x4 --baseline before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+REPLAY_DIR = HERE.parent.parent / "reports_"
+SYNTHETIC_ORG = "bench-org"
+
+PRESETS = {
+    "quick": ["replay:*", "ga-replay:*", "synthetic:200x3", "ga-synthetic:200"],
+    "scale": ["synthetic:1000x10", "synthetic:10000x10", "ga-synthetic:5000"],
+}
+
+
+def replay_slugs(name: str) -> List[str]:
+    return sorted(p.parent.name for p in REPLAY_DIR.glob(f"*/{name}"))
+
+
+def expand(scenarios: List[str]) -> List[str]:
+    out = []
+    for s in scenarios:
+        kind, _, arg = s.partition(":")
+        if arg == "*":
+            name = "ga-usage.json" if kind == "ga-replay" else "org-audit.json"
+            out += [f"{kind}:{slug}" for slug in replay_slugs(name)]
+        else:
+            out.append(s)
+    return out
+
+
+def compare_rows(expected: List[Dict[str, Any]], got: List[Dict[str, Any]]) -> List[str]:
+    """Diferenças nos campos gravados (campos novos do org-audit são ignorados)."""
+    by_name = {r["name"]: r for r in got}
+    diffs = []
+    for e in expected:
+        g = by_name.get(e["name"])
+        if g is None:
+            diffs.append(f"{e['name']}: missing")
+            continue
+        diffs += [f"{e['name']}.{k}: {e[k]!r} != {g.get(k)!r}" for k in e if k != "branches" and g.get(k) != e[k]]
+        got_b = {b["branch"]: b for b in g.get("branches", [])}
+        for b in e.get("branches", []):
+            gb = got_b.get(b["branch"], {})
+            diffs += [f"{e['name']}@{b['branch']}.{k}: {b[k]!r} != {gb.get(k)!r}" for k in b if gb.get(k) != b[k]]
+    diffs += [f"{n}: unexpected" for n in sorted(set(by_name) - {e["name"] for e in expected})]
+    return diffs
+
+
+def synthetic_diffs(
+    fixture: Dict[str, Any], got: List[Dict[str, Any]], ext_buckets: Dict[str, str], same_shas: bool = True,
+) -> List[str]:
+    """
+    Diferenças entre as linhas e o que as árvores da org sintética dão (mesma
+    regra de extensão do analyze_tree). same_shas=False no git:, onde os
+    commits dos repos bare têm SHAs próprios.
+    """
+    keys = list(dict.fromkeys(ext_buckets.values()))
+
+    def bucket(path: str) -> str:
+        dot = path.rfind(".")
+        return (ext_buckets.get(path[dot:].lower()) if dot > path.rfind("/") else None) or "other"
+
+    by_name = {r["full_name"]: r for r in got}
+    diffs = []
+    for repo in fixture["repos"]:
+        g = by_name.pop(repo["full_name"], None)
+        if g is None:
+            diffs.append(f"{repo['name']}: missing")
+            continue
+        got_b = {b["branch"]: b for b in g.get("branches", [])}
+        if set(got_b) != set(repo["branches"]):
+            diffs.append(f"{repo['name']}.branches: {sorted(got_b)} != {sorted(repo['branches'])}")
+        union: Dict[str, set] = {}
+        for br, sha in repo["branches"].items():
+            want = dict.fromkeys(keys + ["other"], 0)
+            for e in fixture["trees"][sha]:
+                if e.get("type") == "blob":
+                    k = bucket(e["path"])
+                    want[k] += 1
+                    union.setdefault(k, set()).add(e["path"])
+            want = {"head_sha": sha, "total_files": sum(want.values()), **{k: want[k] for k in keys}}
+            if not same_shas:
+                del want["head_sha"]
+            gb = got_b.get(br, {})
+            diffs += [f"{repo['name']}@{br}.{k}: {gb.get(k)!r} != {v!r}" for k, v in want.items() if gb.get(k) != v]
+        want = {f"unique_{k}": len(union.get(k, ())) for k in keys}
+        want["unique_total_files"] = sum(len(v) for v in union.values())
+        want["unique_complete"] = True
+        want["branches_count"] = len(repo["branches"])
+        diffs += [f"{repo['name']}.{k}: {g.get(k)!r} != {v!r}" for k, v in want.items() if g.get(k) != v]
+    diffs += [f"{n}: unexpected" for n in sorted(by_name)]
+    return diffs
+
+
+# ------------------------------------------------------------------ filho
+
+
+def child_org_audit(scenario: str, files: int) -> Dict[str, Any]:
+    import org_audit
+
+    kind, _, arg = scenario.partition(":")
+    slug = arg if kind == "replay" else SYNTHETIC_ORG
+    t0 = time.perf_counter()
+    org_audit.main([])
+    result: Dict[str, Any] = {"run_s": time.perf_counter() - t0}
+
+    with open(os.path.join(org_audit.REPORT_DIR, slug, "org-audit.json"), "r", encoding="utf-8") as f:
+        rows = json.load(f)
+    result["repos"] = len(rows)
+    result["branches"] = sum(r.get("branches_count", 0) for r in rows)
+    if kind == "replay":
+        with open(REPLAY_DIR / slug / "org-audit.json", "r", encoding="utf-8") as f:
+            diffs = compare_rows(json.load(f), rows)
+        result["ok"] = not diffs
+        result["diffs"] = diffs[:10]
+    else:
+        # synthetic_org é determinística: a mesma fixture do mock, gerada de novo
+        diffs = synthetic_diffs(fixture_for(scenario, files)[1], rows, org_audit.EXT_BUCKETS, kind != "git")
+        result["ok"] = result["repos"] > 0 and not diffs
+        result["diffs"] = diffs[:10]
+    return result
+
+
+def child_ga(scenario: str) -> Dict[str, Any]:
+    import ga_audit_usage as ga
+    from mock_ga import ReplayClient, StubClient
+
+    kind, _, arg = scenario.partition(":")
+    today = date.today()
+    if kind == "ga-replay":
+        org = arg
+        with open(REPLAY_DIR / org / "ga-usage.json", "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+        prop = recorded["property_id"]
+        client: Any = ReplayClient({prop: recorded}, today)
+    else:
+        org, prop, recorded = SYNTHETIC_ORG, "100000", None
+        client = StubClient(int(arg), 0.0)
+    os.environ[f"GA_PROPERTY_ID_{ga.norm_org_to_env(org)}"] = prop
+
+    t0 = time.perf_counter()
+    [res] = ga.audit_orgs(client, [org], store_path="ga.sqlite", today=today)
+    result: Dict[str, Any] = {"run_s": time.perf_counter() - t0}
+    if isinstance(res, Exception):
+        return dict(result, ok=False, diffs=[repr(res)])
+
+    result["requests"] = sum(v for k, v in client.calls.items() if k != "rows")
+    result["rows"] = client.calls["rows"]
+    with open(ga.REPORTS / org / ga.usage_filename(ga.DAYS), "r", encoding="utf-8") as f:
+        got = json.load(f)["metrics_by_path"]
+    result["paths"] = len(got)
+    if recorded is None:
+        result["ok"] = bool(got)
+    else:
+        want = recorded["metrics_by_path"]
+        diffs = [f"{p}: missing" for p in want if p not in got]
+        diffs += [f"{p}.{k}: {v!r} != {got[p].get(k)!r}" for p in want if p in got
+                  for k, v in want[p].items() if got[p].get(k) != v]
+        diffs += [f"{p}: unexpected" for p in got if p not in want]
+        result["ok"] = not diffs
+        result["diffs"] = diffs[:10]
+    return result
+
+
+def run_child(scenario: str, result_path: str, files: int) -> None:
+    kind = scenario.partition(":")[0]
+    result = child_ga(scenario) if kind.startswith("ga-") else child_org_audit(scenario, files)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ------------------------------------------------------------------ pai
+
+
+def fixture_for(scenario: str, files: int):
+    from mock_github import fixture_from_report, synthetic_org
+
+    kind, _, arg = scenario.partition(":")
+    if kind == "replay":
+        with open(REPLAY_DIR / arg / "org-audit.json", "r", encoding="utf-8") as f:
+            return arg, fixture_from_report(json.load(f))
+    repos, _, branches = arg.partition("x")
+    return SYNTHETIC_ORG, synthetic_org(SYNTHETIC_ORG, int(repos), int(branches or 1), files)
+
+
+def run_scenario(scenario: str, args) -> Dict[str, Any]:
+    kind = scenario.partition(":")[0]
+    work = tempfile.mkdtemp(prefix="bench-suite-")
+    result_path = os.path.join(work, "result.json")
+    env = dict(os.environ, PYTHONPATH=str(HERE), GA_COMPACT="0", GA_PRECOMPRESS="")
+
+    mock = None
+    if kind in ("replay", "synthetic", "git"):
+        from mock_github import MockGitHub, write_git_repos
+
+        slug, fixture = fixture_for(scenario, args.files)
+        if kind == "git":
+            # repos bare fora da medição; o clone dos mirrors entra no tempo
+            env.update(
+                AUDIT_TREE_BACKEND="git",
+                AUDIT_GIT_URL=write_git_repos(fixture, os.path.join(work, "bare")),
+                AUDIT_MIRROR_DIR=os.path.join(work, "mirrors"),
+            )
+        mock = MockGitHub([fixture], latency=args.latency)
+        env.update(
+            ORGS=slug,
+            GH_TOKEN="mock",
+            GH_API_URL=mock.start(),
+            AUDIT_CACHE_DIR="",
+            AUDIT_HISTORY_DIR="",
+            AUDIT_INCREMENTAL="0",
+        )
+    elif kind not in ("ga-replay", "ga-synthetic"):
+        raise SystemExit(f"unknown scenario: {scenario}")
+
+    try:
+        with open(os.path.join(work, "child.log"), "wb") as log:
+            t0 = time.perf_counter()
+            p = subprocess.Popen(
+                [sys.executable, str(Path(__file__).resolve()), "--child", scenario, "--result", result_path,
+                 "--files", str(args.files)],
+                cwd=work, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+            _, status, usage = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+            wall = time.perf_counter() - t0
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    try:
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        result = {"ok": False, "diffs": [f"child exited {p.returncode}, see {work}/child.log"]}
+
+    if mock is not None:
+        result["requests"] = sum(mock.counts.values())
+    result.update(
+        wall_s=round(wall, 3),
+        run_s=round(result.get("run_s", 0.0), 3),
+        peak_rss_mb=round(usage.ru_maxrss / 1024, 1),  # Linux: KB
+        exit=p.returncode,
+    )
+    result["ok"] = bool(result.get("ok")) and p.returncode == 0
+    return result
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tol: float) -> List[str]:
+    """Regressões contra o baseline: tempo e memória acima de (1 + tol), qualquer request a mais."""
+    out = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        for key, limit in (("run_s", 1 + tol), ("peak_rss_mb", 1 + tol), ("requests", 1.0)):
+            old, new = b.get(key), r.get(key)
+            if old and new is not None and new > old * limit:
+                out.append(f"{name}: {key} {old} -> {new} ({new / old:.2f}x)")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("scenarios", nargs="*", help="cenários (default: o preset)")
+    ap.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    ap.add_argument("--files", type=int, default=50, help="arquivos por árvore nos cenários synthetic")
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per mocked GitHub request")
+    ap.add_argument("--out", help="grava os resultados em JSON")
+    ap.add_argument("--baseline", help="JSON de um run anterior (--out) pra comparar")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="folga de tempo/memória contra o baseline")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    ap.add_argument("--result", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args.child, args.result, args.files)
+        return
+
+    scenarios = expand(args.scenarios or PRESETS[args.preset])
+    results: Dict[str, Dict[str, Any]] = {}
+    print(f"{'scenario':<32} {'ok':>3} {'run s':>8} {'wall s':>8} {'requests':>9} {'peak MB':>8}")
+    for s in scenarios:
+        r = run_scenario(s, args)
+        results[s] = r
+        print(f"{s:<32} {'yes' if r['ok'] else 'NO':>3} {r['run_s']:8.2f} {r['wall_s']:8.2f} "
+              f"{r.get('requests', 0):9d} {r['peak_rss_mb']:8.1f}")
+        for d in r.get("diffs") or []:
+            print(f"    {d}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "generated_at": datetime.utcnow().isoformat() + "Z",
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "scenarios": results,
+            }, f, indent=2)
+        print(f"[ok] wrote {args.out}")
+
+    failed = [s for s, r in results.items() if not r["ok"]]
+    regressions: List[str] = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f).get("scenarios", {}), args.tolerance)
+        for line in regressions:
+            print(f"[regression] {line}")
+        print(f"[baseline] {len(regressions)} regression(s) vs {args.baseline}")
+    if failed or regressions:
+        raise SystemExit(f"failed: {', '.join(failed) or '-'}; regressions: {len(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark do parse de YAML do workflow_to_mermaid.py.
+
+Gera um corpus de workflows sintéticos e mede o throughput de:
+  - SafeLoader (Python puro, o antigo yaml.safe_load)
+  - CSafeLoader (LibYAML), se o PyYAML tiver sido compilado com ela
+  - parse_yaml com cache em disco já quente (hash + pickle.load)
+e confere que os documentos saem iguais.
+
+  python .github/scripts/bench_workflow_yaml.py --workflows 300 --jobs 6 --steps 12
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+import yaml  # noqa: E402
+
+import workflow_to_mermaid as wtm  # noqa: E402
+
+USES = ["actions/checkout@v4", "actions/setup-python@v5", "actions/setup-node@v4",
+        "actions/cache@v4", "actions/upload-artifact@v4", "aws-actions/configure-aws-credentials@v4"]
+RUNS = ["python -m pip install -r requirements.txt", "npm ci && npm run build",
+        "terraform plan -out tfplan", "curl -sSf https://example.org/health", "pytest -q"]
+
+
+def synthetic_workflow(rnd: random.Random, i: int, n_jobs: int, n_steps: int) -> str:
+    lines = [f"name: Synthetic {i}", "", "on:", "  push:", "    branches: [main]",
+             "  workflow_dispatch:", "    inputs:", "      orgs:", "        type: string",
+             "        default: \"\"", "", "env:", f"  ORGS: org-{i}", "", "jobs:"]
+    for j in range(n_jobs):
+        lines += [f"  job_{j}:", f"    name: Job {j}", "    runs-on: ubuntu-latest"]
+        if j:
+            lines.append(f"    needs: [job_{j - 1}]")
+        lines.append("    steps:")
+        for k in range(n_steps):
+            if rnd.random() < 0.5:
+                lines += [f"      - name: Step {k}", f"        uses: {rnd.choice(USES)}",
+                          "        with:", f"          key: k-{i}-{j}-{k}", "          path: .cache"]
+            else:
+                lines += [f"      - name: Step {k}", "        env:", "          FOO: \"1\"",
+                          "        run: |", f"          {rnd.choice(RUNS)}", "          echo done"]
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def bench(label: str, fn, corpus, repeat: int):
+    best = None
+    docs = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        docs = [fn(raw) for raw in corpus]
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    mb = sum(len(r) for r in corpus) / 1e6
+    print(f"{label:>18}: {best:7.3f}s  {len(corpus) / best:8.0f} files/s  {mb / best:6.2f} MB/s")
+    return best, docs
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workflows", type=int, default=300)
+    ap.add_argument("--jobs", type=int, default=6)
+    ap.add_argument("--steps", type=int, default=12)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rnd = random.Random(1)
+    corpus = [synthetic_workflow(rnd, i, args.jobs, args.steps).encode("utf-8") for i in range(args.workflows)]
+    print(f"corpus: {len(corpus)} workflows, {sum(len(r) for r in corpus) / 1e6:.2f} MB")
+
+    t_py, ref = bench("SafeLoader (py)", lambda raw: yaml.load(raw, Loader=yaml.SafeLoader), corpus, args.repeat)
+    results = {}
+    if getattr(yaml, "CSafeLoader", None) is not None:
+        results["CSafeLoader"] = bench("CSafeLoader", lambda raw: yaml.load(raw, Loader=yaml.CSafeLoader),
+                                       corpus, args.repeat)
+    else:
+        print(f"{'CSafeLoader':>18}: unavailable (PyYAML without LibYAML)")
+
+    cache_dir = tempfile.mkdtemp(prefix="wf-parse-cache-")
+    for raw in corpus:
+        wtm.parse_yaml(raw, cache_dir)  # aquece o disco
+
+    def cached(raw):
+        wtm._parsed.clear()  # só o cache em disco, como num run novo
+        return wtm.parse_yaml(raw, cache_dir)
+
+    results["parse cache (disk)"] = bench("parse cache (disk)", cached, corpus, args.repeat)
+
+    ok = True
+    for label, (t, docs) in results.items():
+        same = docs == ref
+        ok &= same
+        print(f"{label:>18}: {t_py / t:5.1f}x vs SafeLoader, identical={same}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,64 @@
-import json, os, re
+import argparse, functools, gzip, json, os, re, sqlite3, time
+from datetime import date, timedelta
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from google.analytics.data_v1beta import BetaAnalyticsDataClient
 from google.analytics.data_v1beta.types import (
+    BatchRunReportsRequest,
     RunReportRequest,
     DateRange,
     Dimension,
     Metric,
     FilterExpression,
     Filter,
+    OrderBy,
 )
 
+from run_metrics import RunMetrics, add_cli_flags
+
+try:
+    import brotli  # opcional: só pra cópia .br pré-comprimida
+except ImportError:
+    brotli = None
+
 ROOT = Path(".")
 REPORTS = ROOT / "reports"
 
+# janela do ga-usage.json; GA_WINDOWS adiciona ga-usage-<N>d.json (ex: 7 e 90)
+DAYS = 30
+GA_WINDOWS = sorted({DAYS} | {int(x) for x in os.environ.get("GA_WINDOWS", "7,30,90").split(",") if x.strip()})
+
+# agregados diários por property (SQLite); "" = só em memória (refaz tudo a cada run)
+GA_STORE = os.environ.get("GA_STORE", ".cache/ga-usage/ga.sqlite").strip()
+# dias buscados há menos que isso ainda podem mudar no GA: busca de novo
+GA_FINAL_DAYS = int(os.environ.get("GA_FINAL_DAYS", "3"))
+
+# GA_COMPACT=1: ga-usage*.json colunar, chaves curtas, sem indent
+GA_COMPACT = os.environ.get("GA_COMPACT", "0").strip() not in ("0", "false", "no", "")
+# top-K países/sources por path no ga-usage*.summary.json (o resto vira "(other)")
+GA_TOP_K = int(os.environ.get("GA_TOP_K", "5"))
+# cópias pré-comprimidas ao lado de cada json: "gz", "br" ou "gz,br"
+GA_PRECOMPRESS = [x.strip() for x in os.environ.get("GA_PRECOMPRESS", "").split(",") if x.strip()]
+
+# properties (orgs) consultadas em paralelo
+GA_PARALLEL = int(os.environ.get("GA_PARALLEL", "4"))
+# GA_BATCH=0 volta a mandar um run_report por relatório
+GA_BATCH = os.environ.get("GA_BATCH", "1").strip() not in ("0", "false", "no", "")
+# limite do batchRunReports
+BATCH_MAX = 5
+# limite de date_ranges por relatório (relatório "users": um por janela)
+DATE_RANGES_MAX = 4
+# linhas por página (máx. da API: 250000) e páginas extras buscadas em paralelo
+GA_PAGE_SIZE = int(os.environ.get("GA_PAGE_SIZE", "100000"))
+GA_PAGE_PARALLEL = int(os.environ.get("GA_PAGE_PARALLEL", "4"))
+# teto de linhas por relatório (0 = sem teto); acima disso o payload marca "capped"
+GA_MAX_ROWS = int(os.environ.get("GA_MAX_ROWS", "0"))
+
+# spans por fase/chamada -> reports/run-metrics.json (run_metrics.py)
+METRICS = RunMetrics("ga_audit_usage")
+
 
 def norm_org_to_env(org: str) -> str:
     # academic-codex -> ACADEMIC_CODEX
@@ -33,15 +77,16 @@ def write_credentials_from_secret() -> str:
     return str(cred_path)
 
 
-def run_report(
-    client,
+def build_report_request(
     property_id: str,
-    days: int,
+    start_date: str,
+    end_date: str,
     dimensions: list[str],
     metrics: list[str],
     event_name: str | None = None,
     limit: int = 100000,
-):
+    offset: int = 0,
+) -> RunReportRequest:
     dim_objs = [Dimension(name=d) for d in dimensions]
     met_objs = [Metric(name=m) for m in metrics]
 
@@ -56,13 +101,159 @@ def run_report(
 
     req = RunReportRequest(
         property=f"properties/{property_id}",
-        date_ranges=[DateRange(start_date=f"{days}daysAgo", end_date="today")],
+        date_ranges=[DateRange(start_date=start_date, end_date=end_date)],
         dimensions=dim_objs,
         metrics=met_objs,
         dimension_filter=dim_filter,
+        # ordem estável pra paginação por offset não pular/repetir linhas
+        order_bys=[OrderBy(dimension=OrderBy.DimensionOrderBy(dimension_name=d)) for d in dimensions],
         limit=limit,
+        offset=offset,
     )
-    return client.run_report(req)
+    return req
+
+
+# Os 4 relatórios por property (nome -> kwargs de build_report_request).
+# Todos quebrados por "date": o store guarda um agregado por dia e as janelas
+# saem de somas sobre ele.
+REPORT_SPECS = {
+    # 1) Métricas principais por pagePath (GA4 padrão)
+    # - views: screenPageViews (page_view “equivalente”)
+    # - sessions: sessions
+    # - users: totalUsers (por dia, só no store; o users das janelas vem do WINDOW_USERS)
+    # - engagedSessions: engagementRate da janela = engagedSessions / sessions
+    "base": dict(
+        dimensions=["date", "pagePath"],
+        metrics=["screenPageViews", "sessions", "totalUsers", "engagedSessions"],
+    ),
+    # 2) Clicks por pagePath (evento "click" como você já fazia)
+    "clicks": dict(
+        dimensions=["date", "pagePath"],
+        metrics=["eventCount"],
+        event_name="click",
+    ),
+    # 3) Países: distribuição por pagePath (uso de countryId => BR, US...)
+    # Métrica: screenPageViews (pra refletir “views”)
+    "countries": dict(
+        dimensions=["date", "pagePath", "countryId"],
+        metrics=["screenPageViews"],
+    ),
+    # 4) Sources: distribuição por pagePath (sessionSource)
+    # Métrica: sessions (pra refletir tráfego real)
+    "sources": dict(
+        dimensions=["date", "pagePath", "sessionSource"],
+        metrics=["sessions"],
+    ),
+}
+
+# 5) Usuários únicos por pagePath em cada janela (totalUsers não soma entre
+# dias): um date_range por janela, no slot que sobra do batch
+WINDOW_USERS = dict(dimensions=["pagePath"], metrics=["totalUsers"])
+
+
+def build_users_request(
+    property_id: str,
+    today: date,
+    windows: list[int],
+    limit: int = 100000,
+    offset: int = 0,
+) -> RunReportRequest:
+    """WINDOW_USERS com um DateRange "<N>d" por janela (mesmo intervalo do GaStore.window)."""
+    req = build_report_request(property_id, today.isoformat(), today.isoformat(), limit=limit, offset=offset, **WINDOW_USERS)
+    req.date_ranges = [
+        DateRange(start_date=(today - timedelta(days=w)).isoformat(), end_date=today.isoformat(), name=f"{w}d")
+        for w in windows
+    ]
+    if len(windows) > 1:
+        # com mais de um date_range a linha é (pagePath, dateRange): a ordem
+        # precisa dos dois pra paginação por offset não pular/repetir linhas
+        req.order_bys = [OrderBy(dimension=OrderBy.DimensionOrderBy(dimension_name=d))
+                         for d in ("dateRange", "pagePath")]
+    return req
+
+
+def report_builders(
+    property_id: str,
+    rng: tuple[str, str] | None,
+    today: date,
+    windows: list[int],
+) -> dict:
+    """
+    nome -> build(limit=, offset=) dos relatórios de um ingest: os REPORT_SPECS
+    de rng (None = store em dia) e "users" (+ "users.1"... acima de DATE_RANGES_MAX janelas).
+    """
+    builders = {}
+    if rng is not None:
+        for name, spec in REPORT_SPECS.items():
+            builders[name] = functools.partial(build_report_request, property_id, *rng, **spec)
+    for i in range(0, len(windows), DATE_RANGES_MAX):
+        name = f"users.{i // DATE_RANGES_MAX}" if i else "users"
+        builders[name] = functools.partial(build_users_request, property_id, today, windows[i:i + DATE_RANGES_MAX])
+    return builders
+
+
+def iter_report_pages(
+    client,
+    property_id: str,
+    builders: dict,
+    use_batch: bool = True,
+    page_size: int | None = None,
+    max_rows: int | None = None,
+):
+    """
+    Gera (nome, offset, RunReportResponse) de cada relatório de `builders`
+    (report_builders), página a página.
+
+    A primeira página de cada relatório vem junta (batch_run_reports, até BATCH_MAX
+    por chamada); se row_count passar de page_size, as páginas seguintes (offset)
+    são buscadas em paralelo e entregues na ordem em que chegam. Nenhuma página
+    passa de max_rows (0 = sem limite).
+    """
+    page_size = page_size or GA_PAGE_SIZE
+    max_rows = GA_MAX_ROWS if max_rows is None else max_rows
+    first_size = min(page_size, max_rows) if max_rows else page_size
+
+    names = list(builders)
+    reqs = [builders[n](limit=first_size) for n in names]
+
+    first = {}
+    if not use_batch:
+        for n, req in zip(names, reqs):
+            with METRICS.span("ga.run_report"):
+                first[n] = client.run_report(req)
+    else:
+        for i in range(0, len(reqs), BATCH_MAX):
+            chunk = reqs[i:i + BATCH_MAX]
+            for req in chunk:
+                req.property = ""  # no batch a property vai só no request de fora
+            with METRICS.span("ga.batch_run_reports"):
+                resp = client.batch_run_reports(BatchRunReportsRequest(
+                    property=f"properties/{property_id}",
+                    requests=chunk,
+                ))
+            first.update(zip(names[i:i + BATCH_MAX], resp.reports))
+
+    pending = []  # (nome, offset, limit)
+    for n in names:
+        resp = first[n]
+        yield n, 0, resp
+        stop = resp.row_count if not max_rows else min(resp.row_count, max_rows)
+        for off in range(first_size, stop, page_size):
+            pending.append((n, off, min(page_size, stop - off)))
+
+    if not pending:
+        return
+
+    def page(n: str, off: int, limit: int):
+        req = builders[n](limit=limit, offset=off)
+        with METRICS.span("ga.run_report"):
+            return client.run_report(req)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(GA_PAGE_PARALLEL, len(pending)))) as ex:
+        futs = {ex.submit(page, *p): p for p in pending}
+        for fut in as_completed(futs):
+            n, off, _ = futs[fut]
+            yield n, off, fut.result()
 
 
 def as_int(s: str) -> int:
@@ -79,167 +270,478 @@ def as_float(s: str) -> float:
         return 0.0
 
 
-def top_percent_dict(counts: dict[str, int], top_k: int = 1) -> dict[str, int]:
-    """
-    Retorna {key: pct_int} para os top_k, pct arredondado.
-    Ex: {"BR": 62, "US": 18}
-    """
-    if not counts:
-        return {}
-    total = sum(counts.values())
-    if total <= 0:
-        return {}
-
-    items = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
-    out = {}
-    for k, v in items:
-        pct = int(round(100.0 * v / total))
-        out[k] = pct
-    return out
+def blank_path_metrics() -> dict:
+    return {
+        "views": 0, "sessions": 0, "users": 0, "clicks": 0,
+        "engagement_rate": 0.0,
+        "countries": {}, "sources": {}
+    }
 
 
-def main():
-    cred_path = write_credentials_from_secret()
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = cred_path
+def ga_date(v: str) -> str:
+    # 20261018 -> 2026-10-18
+    return f"{v[:4]}-{v[4:6]}-{v[6:8]}" if len(v) == 8 else v
 
-    orgs_raw = os.environ.get("ORGS", "").strip()
-    if not orgs_raw:
-        raise SystemExit("Missing ORGS env")
 
-    orgs = [x.strip() for x in orgs_raw.split(",") if x.strip()]
-    client = BetaAnalyticsDataClient()
+class DailyAccumulator:
+    """
+    Dobra as páginas dos REPORT_SPECS conforme chegam (em qualquer ordem)
+    em agregados por (dia, path); GaStore.replace_days grava o resultado.
+    O relatório "users" vai pra window_users (fora do store).
+    """
 
-    DAYS = 30
+    def __init__(self, windows: list[int] | None = None):
+        self.windows = list(windows or [])
+        self.pages: dict[tuple, list] = {}                 # (date, path) -> [views, sessions, users, engaged]
+        self.clicks: dict[tuple, int] = {}                 # (date, path) -> count
+        self.countries: dict[tuple, int] = defaultdict(int)  # (date, path, country) -> views
+        self.sources: dict[tuple, int] = defaultdict(int)    # (date, path, source) -> sessions
+        self.window_users: dict[int, dict[str, int]] = {w: {} for w in self.windows}  # janela -> {path: totalUsers}
+        self.coverage: dict[str, dict] = {}
+
+    def add(self, name: str, resp) -> None:
+        cov = self.coverage.setdefault(name, {
+            "rows": 0, "row_count": 0, "pages": 0,
+            "sampled": False, "thresholded": False, "other_row": False,
+        })
+        cov["rows"] += len(resp.rows)
+        cov["row_count"] = max(cov["row_count"], resp.row_count)
+        cov["pages"] += 1
+        meta = resp.metadata
+        cov["sampled"] |= bool(meta.sampling_metadatas)
+        cov["thresholded"] |= bool(meta.subject_to_thresholding)
+        cov["other_row"] |= bool(meta.data_loss_from_other_row)
+
+        if name.startswith("users"):
+            self._add_users(name, resp)
+        else:
+            getattr(self, f"_add_{name}")(resp.rows)
+
+    def _add_base(self, rows) -> None:
+        for row in rows:
+            key = (ga_date(row.dimension_values[0].value), row.dimension_values[1].value)
+            self.pages[key] = [as_int(m.value) for m in row.metric_values[:4]]
+
+    def _add_clicks(self, rows) -> None:
+        for row in rows:
+            key = (ga_date(row.dimension_values[0].value), row.dimension_values[1].value)
+            self.clicks[key] = as_int(row.metric_values[0].value)
+
+    def _add_users(self, name: str, resp) -> None:
+        # com mais de um date_range o GA acrescenta a dimensão "dateRange" (= DateRange.name)
+        chunk = int(name.partition(".")[2] or 0)
+        windows = self.windows[chunk * DATE_RANGES_MAX:(chunk + 1) * DATE_RANGES_MAX]
+        headers = [h.name for h in resp.dimension_headers]
+        col = headers.index("dateRange") if "dateRange" in headers else None
+        for row in resp.rows:
+            w = int(row.dimension_values[col].value.rstrip("d")) if col is not None else windows[0]
+            self.window_users[w][row.dimension_values[0].value] = as_int(row.metric_values[0].value)
+
+    def _add_countries(self, rows) -> None:
+        for row in rows:
+            day = ga_date(row.dimension_values[0].value)
+            path = row.dimension_values[1].value
+            country = row.dimension_values[2].value or "??"
+            cnt = as_int(row.metric_values[0].value)
+            if cnt > 0:
+                self.countries[(day, path, country)] += cnt
 
-    for org in orgs:
-        env_key = f"GA_PROPERTY_ID_{norm_org_to_env(org)}"
-        property_id = os.environ.get(env_key, "").strip()
+    def _add_sources(self, rows) -> None:
+        for row in rows:
+            day = ga_date(row.dimension_values[0].value)
+            path = row.dimension_values[1].value
+            source = (row.dimension_values[2].value or "unknown").strip().lower()
+            cnt = as_int(row.metric_values[0].value)
+            if cnt > 0:
+                self.sources[(day, path, source)] += cnt
+
+    def data_quality(self) -> dict:
+        reports = {}
+        for name, cov in self.coverage.items():
+            reports[name] = dict(cov, capped=cov["rows"] < cov["row_count"])
+        return {
+            "capped": any(r["capped"] for r in reports.values()),
+            "sampled": any(r["sampled"] for r in reports.values()),
+            "thresholded": any(r["thresholded"] for r in reports.values()),
+            "other_row": any(r["other_row"] for r in reports.values()),
+            "reports": reports,
+        }
 
-        if not property_id:
-            print(f"[ga] skip org={org} (missing {env_key})")
-            continue
 
-        print(f"[ga] org={org} property_id={property_id}")
-
-        # 1) Métricas principais por pagePath (GA4 padrão)
-        # - views: screenPageViews (page_view “equivalente”)
-        # - sessions: sessions
-        # - users: totalUsers
-        # - engagementRate, averageEngagementTime
-        base = run_report(
-            client,
-            property_id,
-            days=DAYS,
-            dimensions=["pagePath"],
-            metrics=["screenPageViews", "sessions", "totalUsers", "engagementRate"],
-        )
+class GaStore:
+    """
+    Agregados diários do GA por property em SQLite.
 
-        metrics_by_path: dict[str, dict] = {}
+    Cada dia guarda quando foi buscado (fetched_on); dias buscados com menos de
+    GA_FINAL_DAYS de idade são buscados de novo, o resto nunca mais é consultado.
+    As janelas (7/30/90...) são somas sobre os dias guardados.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS days (
+        property_id TEXT, date TEXT, fetched_on TEXT,
+        PRIMARY KEY (property_id, date));
+    CREATE TABLE IF NOT EXISTS pages (
+        property_id TEXT, date TEXT, path TEXT,
+        views INTEGER, sessions INTEGER, users INTEGER, engaged INTEGER, clicks INTEGER,
+        PRIMARY KEY (property_id, date, path));
+    CREATE TABLE IF NOT EXISTS countries (
+        property_id TEXT, date TEXT, path TEXT, country TEXT, views INTEGER,
+        PRIMARY KEY (property_id, date, path, country));
+    CREATE TABLE IF NOT EXISTS sources (
+        property_id TEXT, date TEXT, path TEXT, source TEXT, sessions INTEGER,
+        PRIMARY KEY (property_id, date, path, source));
+    """
 
-        for row in base.rows:
-            path = row.dimension_values[0].value
+    def __init__(self, path: str | None = None):
+        path = GA_STORE if path is None else path
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # uma conexão por org (thread); o WAL deixa ler enquanto outra grava
+        self.db = sqlite3.connect(path or ":memory:", timeout=60)
+        if path:
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(self.SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fetch_range(self, property_id: str, today: date, keep_days: int) -> tuple[str, str] | None:
+        """(start, end) ISO a buscar: do primeiro dia faltando/não final até hoje; None se nada."""
+        first = today - timedelta(days=keep_days)
+        final = {
+            d for d, fetched_on in self.db.execute(
+                "SELECT date, fetched_on FROM days WHERE property_id = ? AND date >= ?",
+                (property_id, first.isoformat()),
+            )
+            if date.fromisoformat(fetched_on) >= date.fromisoformat(d) + timedelta(days=GA_FINAL_DAYS)
+        }
+        day = first
+        while day <= today:
+            if day.isoformat() not in final:
+                return day.isoformat(), today.isoformat()
+            day += timedelta(days=1)
+        return None
+
+    def replace_days(self, property_id: str, start: str, end: str, acc: DailyAccumulator, today: date, keep_days: int) -> None:
+        rng = (property_id, start, end)
+        with self.db:
+            for table in ("pages", "countries", "sources", "days"):
+                self.db.execute(f"DELETE FROM {table} WHERE property_id = ? AND date BETWEEN ? AND ?", rng)
+
+            keys = set(acc.pages) | set(acc.clicks)
+            self.db.executemany(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((property_id, d, p, *acc.pages.get((d, p), (0, 0, 0, 0)), acc.clicks.get((d, p), 0)) for d, p in keys),
+            )
+            self.db.executemany(
+                "INSERT INTO countries VALUES (?, ?, ?, ?, ?)",
+                ((property_id, *k, v) for k, v in acc.countries.items()),
+            )
+            self.db.executemany(
+                "INSERT INTO sources VALUES (?, ?, ?, ?, ?)",
+                ((property_id, *k, v) for k, v in acc.sources.items()),
+            )
 
-            views = as_int(row.metric_values[0].value)
-            sessions = as_int(row.metric_values[1].value)
-            users = as_int(row.metric_values[2].value)
-            engagement_rate = as_float(row.metric_values[3].value)  # 0..1
-            # avg_eng_time = as_float(row.metric_values[4].value)     # segundos
+            day, last = date.fromisoformat(start), date.fromisoformat(end)
+            days = []
+            while day <= last:
+                days.append((property_id, day.isoformat(), today.isoformat()))
+                day += timedelta(days=1)
+            self.db.executemany("INSERT INTO days VALUES (?, ?, ?)", days)
+
+            # fora da maior janela não serve mais
+            cutoff = (today - timedelta(days=keep_days)).isoformat()
+            for table in ("pages", "countries", "sources", "days"):
+                self.db.execute(f"DELETE FROM {table} WHERE property_id = ? AND date < ?", (property_id, cutoff))
+
+    def window(self, property_id: str, today: date, days: int, users: dict[str, int]) -> dict[str, dict]:
+        """
+        metrics_by_path dos últimos `days` dias (mesmo intervalo do antigo "{days}daysAgo".."today").
+        `users` é o totalUsers da janela por path (DailyAccumulator.window_users): usuários
+        únicos não saem da soma dos dias.
+        """
+        args = (property_id, (today - timedelta(days=days)).isoformat(), today.isoformat())
+        where = "WHERE property_id = ? AND date BETWEEN ? AND ?"
 
+        metrics_by_path: dict[str, dict] = {}
+        for path, views, sessions, engaged, clicks in self.db.execute(
+            f"SELECT path, SUM(views), SUM(sessions), SUM(engaged), SUM(clicks) "
+            f"FROM pages {where} GROUP BY path", args
+        ):
             metrics_by_path[path] = {
                 "views": views,
                 "sessions": sessions,
-                "users": users,
-                "clicks": 0,  # preenche depois
-                "engagement_rate": engagement_rate,
-                # "avg_engagement_time_sec": avg_eng_time,
+                "users": users.get(path, 0),
+                "clicks": clicks,
+                "engagement_rate": engaged / sessions if sessions else 0.0,
                 "countries": {},
                 "sources": {},
             }
 
-        # 2) Clicks por pagePath (evento "click" como você já fazia)
-        clicks = run_report(
-            client,
-            property_id,
-            days=DAYS,
-            dimensions=["pagePath"],
-            metrics=["eventCount"],
-            event_name="click",
-        )
+        # guarda TUDO (contagens), a UI mostra só o top
+        for key, table, col in (("countries", "countries", "country"), ("sources", "sources", "source")):
+            metric = "views" if table == "countries" else "sessions"
+            for path, k, cnt in self.db.execute(
+                f"SELECT path, {col}, SUM({metric}) AS n FROM {table} {where} "
+                f"GROUP BY path, {col} ORDER BY path, n DESC", args
+            ):
+                metrics_by_path.setdefault(path, blank_path_metrics())[key][k] = cnt  # ex: {"US": 7, "BR": 4, ...}
+
+        for path, n in users.items():
+            metrics_by_path.setdefault(path, blank_path_metrics())["users"] = n
+        return metrics_by_path
+
+
+# metrics_by_path -> colunas com chave curta (formato compacto/summary)
+USAGE_COLS = {
+    "views": "v",
+    "sessions": "s",
+    "users": "u",
+    "clicks": "c",
+    "engagement_rate": "e",
+    "countries": "co",
+    "sources": "so",
+}
+OTHER_KEY = "(other)"
+
+
+def top_k_counts(counts: dict[str, int], top_k: int) -> dict[str, int]:
+    """
+    Mantém os top_k por contagem e soma o resto em "(other)", pra porcentagem
+    no dashboard continuar sobre o total.
+    Ex: {"BR": 62, "US": 18, "(other)": 20}
+    """
+    items = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)
+    out = dict(items[:top_k])
+    rest = sum(v for _, v in items[top_k:])
+    if rest > 0:
+        out[OTHER_KEY] = out.get(OTHER_KEY, 0) + rest
+    return out
 
-        for row in clicks.rows:
-            path = row.dimension_values[0].value
-            cnt = as_int(row.metric_values[0].value)
-            metrics_by_path.setdefault(path, {
-                "views": 0, "sessions": 0, "users": 0, "clicks": 0,
-                "engagement_rate": 0.0, "avg_engagement_time_sec": 0.0,
-                "countries": {}, "sources": {}
-            })
-            metrics_by_path[path]["clicks"] = cnt
-
-        # 3) Países: distribuição por pagePath (uso de countryId => BR, US...)
-        # Métrica: screenPageViews (pra refletir “views”)
-        countries_resp = run_report(
-            client,
-            property_id,
-            days=DAYS,
-            dimensions=["pagePath", "countryId"],
-            metrics=["screenPageViews"],
-            limit=100000,
-        )
 
-        countries_counts = defaultdict(lambda: defaultdict(int))  # path -> country -> count
-        for row in countries_resp.rows:
-            path = row.dimension_values[0].value
-            country = row.dimension_values[1].value or "??"
-            cnt = as_int(row.metric_values[0].value)
-            if cnt > 0:
-                countries_counts[path][country] += cnt
-
-        # 4) Sources: distribuição por pagePath (sessionSource)
-        # Métrica: sessions (pra refletir tráfego real)
-        sources_resp = run_report(
-            client,
-            property_id,
-            days=DAYS,
-            dimensions=["pagePath", "sessionSource"],
-            metrics=["sessions"],
-            limit=100000,
-        )
+def columnar(metrics_by_path: dict[str, dict], top_k: int | None = None) -> dict:
+    """{"path": [...], "v": [...], ...}: uma lista por métrica, na mesma ordem de path."""
+    cols = {"path": list(metrics_by_path)}
+    for key, short in USAGE_COLS.items():
+        vals = [m.get(key, 0) for m in metrics_by_path.values()]
+        if key == "engagement_rate":
+            vals = [round(v, 4) for v in vals]
+        elif key in ("countries", "sources") and top_k is not None:
+            vals = [top_k_counts(v, top_k) for v in vals]
+        cols[short] = vals
+    return cols
 
-        sources_counts = defaultdict(lambda: defaultdict(int))  # path -> source -> count
-        for row in sources_resp.rows:
-            path = row.dimension_values[0].value
-            source = (row.dimension_values[1].value or "unknown").strip().lower()
-            cnt = as_int(row.metric_values[0].value)
-            if cnt > 0:
-                sources_counts[path][source] += cnt
 
-        # guarda TUDO (contagens), a UI mostra só o top
-        all_paths = set(metrics_by_path.keys()) | set(countries_counts.keys()) | set(sources_counts.keys())
-
-        for path in all_paths:
-            metrics_by_path.setdefault(path, {
-                "views": 0, "sessions": 0, "users": 0, "clicks": 0,
-                "engagement_rate": 0.0,
-                "countries": {}, "sources": {}
-            })
-
-            metrics_by_path[path]["countries"] = dict(countries_counts[path])  # ex: {"US": 7, "BR": 4, ...}
-            metrics_by_path[path]["sources"]   = dict(sources_counts[path])    # ex: {"(direct)": 9, "google": 1, ...}
-
-        payload = {
-            "org": org,
-            "property_id": property_id,
-            "range_days": DAYS,
-            "metrics_by_path": metrics_by_path,
-        }
+def compact_payload(payload: dict, top_k: int | None = None, fmt: str = "columnar-v1") -> dict:
+    out = {k: v for k, v in payload.items() if k != "metrics_by_path"}
+    out["format"] = fmt
+    out["cols"] = columnar(payload["metrics_by_path"], top_k)
+    return out
 
-        out_dir = REPORTS / org
-        out_dir.mkdir(parents=True, exist_ok=True)
-        (out_dir / "ga-usage.json").write_text(
-            json.dumps(payload, ensure_ascii=False, indent=2) + "\n",
-            encoding="utf-8"
-        )
+
+# "/repo/" ou "/repo": o que o dashboard cruza com org-audit.json
+REPO_PATH_RE = re.compile(r"/[^/]*/?")
+
+
+def summary_payload(payload: dict, top_k: int | None = None) -> dict:
+    """
+    O que o dashboard carrega primeiro: só os paths de raiz de repo,
+    com as métricas e o top-K de países/sources.
+    """
+    top_k = GA_TOP_K if top_k is None else top_k
+    repo_paths = {k: m for k, m in payload["metrics_by_path"].items() if REPO_PATH_RE.fullmatch(k)}
+    out = compact_payload(dict(payload, metrics_by_path=repo_paths), top_k, fmt="summary-v1")
+    out["top_k"] = top_k
+    out.pop("data_quality", None)
+    return out
+
+
+def dump_json(obj, compact: bool) -> bytes:
+    if compact:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = json.dumps(obj, ensure_ascii=False, indent=2)
+    return (text + "\n").encode("utf-8")
+
+
+def write_json(out: Path, data: bytes) -> dict[str, int]:
+    """Grava `out` (+ cópias GA_PRECOMPRESS) e volta {nome: bytes}."""
+    out.write_bytes(data)
+    sizes = {out.name: len(data)}
+    for ext in GA_PRECOMPRESS:
+        if ext == "gz":
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+        elif ext == "br" and brotli is not None:
+            packed = brotli.compress(data)
+        else:
+            continue
+        (out.parent / f"{out.name}.{ext}").write_bytes(packed)
+        sizes[f"{out.name}.{ext}"] = len(packed)
+    return sizes
+
+
+def usage_filename(days: int, summary: bool = False) -> str:
+    base = "ga-usage" if days == DAYS else f"ga-usage-{days}d"
+    return f"{base}.summary.json" if summary else f"{base}.json"
+
+
+def fmt_kb(n: int) -> str:
+    return f"{n / 1024:.1f}KB"
+
+
+def write_usage(org: str, payload: dict, compact: bool | None = None) -> dict[str, int]:
+    """Grava ga-usage*.json (pretty ou compacto) e o .summary.json; volta os tamanhos."""
+    compact = GA_COMPACT if compact is None else compact
+    out_dir = REPORTS / org
+    out_dir.mkdir(parents=True, exist_ok=True)
+    days = payload["range_days"]
+
+    full = dump_json(compact_payload(payload), True) if compact else dump_json(payload, False)
+    sizes = write_json(out_dir / usage_filename(days), full)
+    sizes.update(write_json(out_dir / usage_filename(days, summary=True), dump_json(summary_payload(payload), True)))
+
+    if compact:
+        pretty = len(dump_json(payload, False))
+        print(f"[ga] org={org} {usage_filename(days)}: pretty {fmt_kb(pretty)} -> "
+              + ", ".join(f"{name} {fmt_kb(n)}" for name, n in sizes.items()))
+    return sizes
+
+
+def ingest(
+    client,
+    store: GaStore,
+    property_id: str,
+    today: date,
+    windows: list[int],
+    use_batch: bool = GA_BATCH,
+) -> tuple[dict, dict[int, dict[str, int]]]:
+    """
+    Busca os dias novos/não finais (grava no store) e o totalUsers de cada janela.
+    Volta (data_quality, {janela: {path: users}}); data_quality["fetched"] é None se o store já estava em dia.
+    """
+    keep_days = max(windows)
+    rng = store.fetch_range(property_id, today, keep_days)
+    acc = DailyAccumulator(windows)
+    for name, _, resp in iter_report_pages(client, property_id, report_builders(property_id, rng, today, windows), use_batch):
+        with METRICS.span("aggregate"):
+            acc.add(name, resp)
+    if rng is not None:
+        with METRICS.span("store.write"):
+            store.replace_days(property_id, *rng, acc, today, keep_days)
+    dq = dict(acc.data_quality(), fetched={"start": rng[0], "end": rng[1]} if rng else None)
+    return dq, acc.window_users
+
+
+def audit_org(
+    client,
+    org: str,
+    windows: list[int] | None = None,
+    use_batch: bool = GA_BATCH,
+    store_path: str | None = None,
+    today: date | None = None,
+) -> dict | None:
+    env_key = f"GA_PROPERTY_ID_{norm_org_to_env(org)}"
+    property_id = os.environ.get(env_key, "").strip()
+
+    if not property_id:
+        print(f"[ga] skip org={org} (missing {env_key})")
+        return None
+
+    print(f"[ga] org={org} property_id={property_id}")
+    METRICS.scope(org)
+    t0 = time.perf_counter()
+    windows = windows or GA_WINDOWS
+    today = today or date.today()
+
+    with GaStore(store_path) as store:
+        with METRICS.span("ingest"):
+            dq, users = ingest(client, store, property_id, today, windows, use_batch)
+        with METRICS.span("store.window"):
+            payloads = {
+                w: {
+                    "org": org,
+                    "property_id": property_id,
+                    "range_days": w,
+                    "data_quality": dq,
+                    "metrics_by_path": store.window(property_id, today, w, users[w]),
+                }
+                for w in windows
+            }
+    with METRICS.span("write_usage"):
+        for payload in payloads.values():
+            write_usage(org, payload)
+
+    for name, r in dq["reports"].items():
+        if r["capped"]:
+            print(f"[ga][warn] org={org} report={name} capped: {r['rows']}/{r['row_count']} rows")
+    if dq["sampled"] or dq["thresholded"] or dq["other_row"]:
+        flags = [k for k in ("sampled", "thresholded", "other_row") if dq[k]]
+        print(f"[ga][warn] org={org} data is {', '.join(flags)}")
+    pages = sum(r["pages"] for r in dq["reports"].values())
+    if dq["fetched"] is None:
+        print(f"[ga] org={org} store up to date, only window users fetched ({pages} pages)")
+    else:
+        print(f"[ga] org={org} fetched {dq['fetched']['start']}..{dq['fetched']['end']} ({pages} pages)")
+    main_payload = payloads.get(DAYS) or payloads[max(windows)]
+    print(f"[ga] org={org} done in {time.perf_counter() - t0:.1f}s ({len(main_payload['metrics_by_path'])} paths)")
+    return main_payload
+
+
+def audit_orgs(
+    client,
+    orgs: list[str],
+    windows: list[int] | None = None,
+    parallel: int = GA_PARALLEL,
+    use_batch: bool = GA_BATCH,
+    store_path: str | None = None,
+    today: date | None = None,
+) -> list:
+    """Uma org por thread; a falha de uma não derruba as outras (volta a exceção no lugar do payload)."""
+    def one(org: str):
+        try:
+            return audit_org(client, org, windows, use_batch, store_path, today)
+        except Exception as e:
+            print(f"[ga][error] org={org}: {e}")
+            return e
+
+    if parallel <= 1 or len(orgs) <= 1:
+        return [one(o) for o in orgs]
+    with ThreadPoolExecutor(max_workers=min(parallel, len(orgs))) as ex:
+        return list(ex.map(one, orgs))
+
+
+def main(argv: list[str] | None = None):
+    ap = argparse.ArgumentParser(description="Uso (GA4) das orgs em ORGS.")
+    add_cli_flags(ap)
+    args = ap.parse_args(argv)
+
+    cred_path = write_credentials_from_secret()
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = cred_path
+
+    orgs_raw = os.environ.get("ORGS", "").strip()
+    if not orgs_raw:
+        raise SystemExit("Missing ORGS env")
+
+    orgs = [x.strip() for x in orgs_raw.split(",") if x.strip()]
+    client = BetaAnalyticsDataClient()
+
+    METRICS.start(profile=args.profile, trace_memory=args.trace_memory)
+    results = audit_orgs(client, orgs)
+    failed = [o for o, r in zip(orgs, results) if isinstance(r, Exception)]
+    METRICS.write(
+        str(REPORTS / "run-metrics.json"),
+        orgs={o: "error" if isinstance(r, Exception) else "skipped" if r is None else "ok"
+              for o, r in zip(orgs, results)},
+    )
+    if failed:
+        raise SystemExit(f"GA audit failed for: {', '.join(failed)}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Clients GA4 falsos pro bench_ga_audit.py e o bench_suite.py (sem credenciais).
+
+  - StubClient:   linhas sintéticas determinísticas por (property, relatório, dia)
+  - ReplayClient: devolve um ga-usage.json gravado (ex: reports_/<slug>/), com os
+                  totais da janela todos num dia só; o ga_audit_usage tem que
+                  reconstruir o mesmo metrics_by_path.
+
+Ambos imitam BetaAnalyticsDataClient (run_report / batch_run_reports), respeitam
+date_ranges (com a dimensão "dateRange" quando há mais de um), offset e limit,
+e contam chamadas e linhas em .calls.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsResponse,
+    DimensionHeader,
+    DimensionValue,
+    MetricValue,
+    Row,
+    RunReportResponse,
+)
+
+COUNTRIES = ["BR", "US", "PT", "DE", "IN", "FR", "GB", "JP"]
+SOURCES = ["(direct)", "google", "github.com", "bing", "t.co"]
+
+
+def make_row(dims: List[str], mets: List[Any]) -> Row:
+    return Row(
+        dimension_values=[DimensionValue(value=v) for v in dims],
+        metric_values=[MetricValue(value=str(v)) for v in mets],
+    )
+
+
+class StubClient:
+    """Imita BetaAnalyticsDataClient: run_report / batch_run_reports com sleep(latency)."""
+
+    def __init__(self, n_paths: int, latency: float, seed: int = 1):
+        self.n_paths = n_paths
+        self.latency = latency
+        self.seed = seed
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._full = {}
+
+    def _day_rows(self, req, day: str) -> list:
+        # mesmas linhas pro mesmo (property, relatório, dia) em qualquer run
+        names = [d.name for d in req.dimensions]
+        rnd = random.Random(f"{self.seed}:{req.property}:{names}:{day}")
+        rows = []
+        for i in range(self.n_paths):
+            path = f"/repo-{i}/"
+            if len(names) == 2:
+                dims = [[day, path]]
+            else:
+                pool = COUNTRIES if names[2] == "countryId" else SOURCES
+                dims = [[day, path, v] for v in rnd.sample(pool, 2)]
+            for d in dims:
+                rows.append(make_row(d, [rnd.randint(0, 50) for _ in req.metrics]))
+        return rows
+
+    def _users_rows(self, req) -> list:
+        # relatório sem "date" (totalUsers por janela): um valor por (date_range, path)
+        multi = len(req.date_ranges) > 1
+        rows = []
+        for rng in req.date_ranges:
+            rnd = random.Random(f"{self.seed}:{req.property}:users:{rng.start_date}:{rng.end_date}")
+            for i in range(self.n_paths):
+                rows.append(make_row([f"/repo-{i}/"] + ([rng.name] if multi else []), [rnd.randint(0, 500)]))
+        return rows
+
+    def _rows(self, req) -> list:
+        rng = req.date_ranges[0]
+        day, last = date.fromisoformat(rng.start_date), date.fromisoformat(rng.end_date)
+        rows = []
+        while day <= last:
+            rows += self._day_rows(req, day.strftime("%Y%m%d"))
+            day += timedelta(days=1)
+        return rows
+
+    def _report(self, req, prop: str) -> RunReportResponse:
+        if not req.property:
+            req.property = prop
+        names = [d.name for d in req.dimensions]
+        # "clicks" tem as mesmas dimensões do "base": o que separa é métrica e filtro
+        key = (req.property, tuple(names), tuple(m.name for m in req.metrics), str(req.dimension_filter),
+               tuple((r.start_date, r.end_date, r.name) for r in req.date_ranges))
+        with self._lock:
+            rows = self._full.get(key)
+        if rows is None:
+            rows = self._rows(req) if "date" in names else self._users_rows(req)
+            with self._lock:
+                self._full[key] = rows
+        page = rows[req.offset:req.offset + req.limit]
+        with self._lock:
+            self.calls["rows"] += len(page)
+        if len(req.date_ranges) > 1:
+            names.append("dateRange")
+        return RunReportResponse(rows=page, row_count=len(rows),
+                                 dimension_headers=[DimensionHeader(name=n) for n in names])
+
+    def run_report(self, req):
+        with self._lock:
+            self.calls["run_report"] += 1
+        time.sleep(self.latency)
+        return self._report(req, req.property)
+
+    def batch_run_reports(self, req):
+        with self._lock:
+            self.calls["batch_run_reports"] += 1
+        time.sleep(self.latency)
+        return BatchRunReportsResponse(reports=[self._report(r, req.property) for r in req.requests])
+
+
+class ReplayClient(StubClient):
+    """
+    Serve payloads gravados ({property_id: ga-usage.json}) no dia `day`:
+    views/sessions/users/engagedSessions, clicks, countries e sources por path.
+    Dias fora de `day` vêm vazios; o totalUsers de uma janela que contém `day`
+    é o users gravado.
+    """
+
+    def __init__(self, payloads: Dict[str, Dict[str, Any]], day: date, latency: float = 0.0):
+        super().__init__(0, latency)
+        self.payloads = payloads
+        self.day = day
+
+    def _rows(self, req) -> list:
+        rng = req.date_ranges[0]
+        if not rng.start_date <= self.day.isoformat() <= rng.end_date:
+            return []
+        payload = self.payloads.get(req.property.split("/")[-1]) or {}
+        day = self.day.strftime("%Y%m%d")
+        names = [d.name for d in req.dimensions]
+        metric = req.metrics[0].name
+
+        rows = []
+        for path, m in sorted(payload.get("metrics_by_path", {}).items()):
+            if len(names) == 3:
+                dist = m.get("countries" if names[2] == "countryId" else "sources") or {}
+                rows += [make_row([day, path, k], [v]) for k, v in dist.items()]
+            elif metric == "eventCount":
+                if m.get("clicks"):
+                    rows.append(make_row([day, path], [m["clicks"]]))
+            else:
+                engaged = round((m.get("engagement_rate") or 0) * (m.get("sessions") or 0))
+                rows.append(make_row([day, path], [m.get("views", 0), m.get("sessions", 0), m.get("users", 0), engaged]))
+        return rows
+
+    def _users_rows(self, req) -> list:
+        payload = self.payloads.get(req.property.split("/")[-1]) or {}
+        multi = len(req.date_ranges) > 1
+        rows = []
+        for rng in req.date_ranges:
+            if rng.start_date <= self.day.isoformat() <= rng.end_date:
+                rows += [make_row([path] + ([rng.name] if multi else []), [m["users"]])
+                         for path, m in sorted(payload.get("metrics_by_path", {}).items()) if m.get("users")]
+        return rows
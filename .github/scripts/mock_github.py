@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+Mock local (bem pequeno) da API REST do GitHub, só com as rotas que o
+org_audit.py usa. Serve para benchmark sem token e sem rede.
+Respostas 200 têm ETag e respondem 304 a If-None-Match. Toda resposta
+traz X-RateLimit-*; error_rate injeta 502 aleatórios (teste de retry).
+As árvores viram subárvores com SHA por conteúdo (como no git); com
+truncate_over=N, listas recursivas com mais de N entradas vêm truncated.
+
+Rotas:
+  GET /orgs/{org}/repos?page=N
+  GET /repos/{owner}/{repo}/branches?page=N
+  GET /repos/{owner}/{repo}/git/ref/heads/{branch}
+  GET /repos/{owner}/{repo}/git/trees/{sha}
+  GET /repos/{owner}/{repo}/compare/{base}...{head}
+  POST /graphql  (as queries do org_audit: repos+refs da org, refs de um repo,
+                  byteSize de blobs por "<sha>:<path>")
+
+write_git_repos() grava a mesma org como repos bare locais (um commit por
+branch, blobs com o size da fixture), para o AUDIT_TREE_BACKEND=git sem rede.
+
+Histórico de commits: cada sha tem no máximo um pai (trees.parents); o
+merge-base do compare é o próprio sha, o pai ou o pai comum, senão uma
+árvore vazia.
+"""
+import hashlib
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+PER_PAGE = 100
+
+EXTS = [".py", ".ipynb", ".md", ".tex", ".yml", ".json", ".txt", ".png"]
+
+
+class LazyTrees(Mapping):
+    """
+    sha -> árvore sintética, gerada só quando pedida. O conteúdo sai de uma
+    entre `variants` variantes (escolhida pelo sha), então orgs com 100k
+    branches não precisam de 100k árvores em memória nem no mock.
+    """
+
+    def __init__(self, files_per_tree: int, seed: int = 0, variants: int = 4096):
+        self.files_per_tree = files_per_tree
+        self.seed = seed
+        self.variants = max(1, variants)
+        self.shas: set = set()
+        self.parents: Dict[str, str] = {}
+        self._cache: Dict[int, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, sha: str, parent: Optional[str] = None) -> None:
+        """parent: a árvore sai da do pai com poucos arquivos mudados (feature branch)."""
+        self.shas.add(sha)
+        if parent:
+            self.parents[sha] = parent
+
+    def _derive(self, base: List[Dict[str, Any]], sha: str) -> List[Dict[str, Any]]:
+        rnd = random.Random(f"{self.seed}:{sha}")
+        tree = list(base)
+        blobs = [i for i, e in enumerate(tree) if e.get("type") == "blob"]
+        for i in rnd.sample(blobs, min(len(blobs), rnd.randint(1, 5))):
+            tree[i] = {**tree[i], "size": rnd.randint(1, 50_000)}
+        drop = set(rnd.sample(blobs, min(len(blobs), rnd.randint(0, 2))))
+        tree = [e for i, e in enumerate(tree) if i not in drop]
+        for f in range(rnd.randint(1, 3)):
+            ext = rnd.choice(EXTS)
+            tree.append({"path": f"feature/{sha[:7]}/n{f}{ext}", "type": "blob", "size": rnd.randint(1, 50_000)})
+        return tree
+
+    def __getitem__(self, sha: str) -> List[Dict[str, Any]]:
+        if sha not in self.shas:
+            raise KeyError(sha)
+        parent = self.parents.get(sha)
+        if parent:
+            return self._derive(self[parent], sha)
+        v = int(sha[:8], 16) % self.variants
+        with self._lock:
+            tree = self._cache.get(v)
+            if tree is None:
+                rnd = random.Random(f"{self.seed}:{v}")
+                tree = [{"path": ".gitignore", "type": "blob", "size": 10},
+                        {"path": "README.md", "type": "blob", "size": 100}]
+                for f in range(self.files_per_tree):
+                    ext = rnd.choice(EXTS)
+                    tree.append({"path": f"src/d{f % 7}/f{f}{ext}", "type": "blob", "size": rnd.randint(1, 50_000)})
+                tree.append({"path": "src", "type": "tree"})
+                self._cache[v] = tree
+        return tree
+
+    def __iter__(self):
+        return iter(self.shas)
+
+    def __len__(self) -> int:
+        return len(self.shas)
+
+
+def synthetic_org(
+    org: str,
+    n_repos: int = 20,
+    branches_per_repo: int = 3,
+    files_per_tree: int = 50,
+    seed: int = 0,
+    variants: int = 4096,
+) -> Dict[str, Any]:
+    """
+    Gera uma org fake: {"org", "repos": [...], "trees": {sha: [entries]}}.
+    Cada repo tem "branches": {nome: sha}. Branches extras apontam para
+    o mesmo sha da main de vez em quando (branch velha), como na vida real;
+    as outras são filhas da main com alguns arquivos mudados.
+    As árvores são geradas sob demanda (LazyTrees): escala até ~10k repos x 10 branches.
+    """
+    rnd = random.Random(seed)
+    repos: List[Dict[str, Any]] = []
+    trees = LazyTrees(files_per_tree, seed, variants)
+
+    for i in range(n_repos):
+        name = f"repo-{i:05d}"
+        branches: Dict[str, str] = {}
+        main_sha = f"{rnd.getrandbits(160):040x}"
+        for b in range(branches_per_repo):
+            br = "main" if b == 0 else f"feature-{b}"
+            if b == 0 or rnd.random() < 0.5:
+                sha = main_sha
+            else:
+                sha = f"{rnd.getrandbits(160):040x}"
+            branches[br] = sha
+            trees.add(sha, parent=None if sha == main_sha else main_sha)
+
+        repos.append({
+            "name": name,
+            "full_name": f"{org}/{name}",
+            "html_url": f"https://github.com/{org}/{name}",
+            "owner": {"login": org},
+            "private": False,
+            "archived": False,
+            "fork": False,
+            "default_branch": "main",
+            "pushed_at": "2025-01-01T00:00:00Z",
+            "branches": branches,
+        })
+
+    return {"org": org, "repos": repos, "trees": trees}
+
+
+# contador do org-audit -> extensão usada nos arquivos reconstruídos
+REPORT_EXTS = {
+    "notebooks_ipynb": ".ipynb",
+    "files_py": ".py",
+    "files_tex": ".tex",
+    "files_md": ".md",
+    "files_yml": ".yml",
+}
+
+
+def tree_from_stats(stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Árvore plana cujo analyze_tree dá os mesmos contadores do relatório
+    (has_gitignore, has_readme, contadores por extensão, total_files).
+    """
+    tree: List[Dict[str, Any]] = []
+    counts = {k: int(stats.get(k) or 0) for k in REPORT_EXTS}
+    if stats.get("has_readme"):
+        if counts["files_md"]:
+            tree.append({"path": "README.md", "type": "blob", "size": 100})
+            counts["files_md"] -= 1
+        else:
+            tree.append({"path": "README", "type": "blob", "size": 100})
+    if stats.get("has_gitignore"):
+        tree.append({"path": ".gitignore", "type": "blob", "size": 10})
+    for key, ext in REPORT_EXTS.items():
+        tree.extend({"path": f"{key}/f{i}{ext}", "type": "blob", "size": 1000} for i in range(counts[key]))
+    rest = int(stats.get("total_files") or 0) - len(tree)
+    tree.extend({"path": f"other/f{i}.bin", "type": "blob", "size": 1000} for i in range(max(0, rest)))
+    return tree
+
+
+def fixture_from_report(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fixture do mock a partir de um org-audit.json gravado (ex: reports_/<slug>/):
+    mesmos repos, branches e head_sha, com árvores que reproduzem os contadores.
+    Rodar o org_audit contra ela tem que devolver os números gravados.
+    """
+    repos: List[Dict[str, Any]] = []
+    trees: Dict[str, List[Dict[str, Any]]] = {}
+    org = ""
+    for r in rows:
+        org = org or r["org"]
+        owner = r["full_name"].split("/")[0]
+        branches = {}
+        for b in r.get("branches", []):
+            branches[b["branch"]] = b["head_sha"]
+            trees.setdefault(b["head_sha"], tree_from_stats(b))
+        repos.append({
+            "name": r["name"],
+            "full_name": r["full_name"],
+            "html_url": r["url"],
+            "owner": {"login": owner},
+            "private": r.get("private", False),
+            "archived": r.get("archived", False),
+            "fork": r.get("fork", False),
+            "default_branch": r.get("default_branch") or "main",
+            "pushed_at": r.get("pushed_at") or "",
+            "branches": branches,
+        })
+    return {"org": org, "repos": repos, "trees": trees}
+
+
+def write_git_repos(fixture: Dict[str, Any], root: str) -> str:
+    """
+    Um repo bare por repo da fixture em <root>/<full_name>.git, com uma
+    branch por entrada de "branches" (commit sem pai com a árvore do sha).
+    Blobs de mesmo size têm o mesmo conteúdo, então o fast-import é barato.
+    Devolve o template para AUDIT_GIT_URL.
+    """
+    for repo in fixture["repos"]:
+        path = os.path.join(root, f"{repo['full_name']}.git")
+        subprocess.run(["git", "init", "--bare", "--quiet", path], check=True)
+        sizes: Dict[int, int] = {}  # size -> mark
+        out: List[bytes] = []
+
+        def blob(size: int) -> int:
+            if size not in sizes:
+                sizes[size] = len(sizes) + 1
+                out.append(b"blob\nmark :%d\ndata %d\n%s\n" % (sizes[size], size, b"x" * size))
+            return sizes[size]
+
+        by_sha: Dict[str, List[Tuple[str, int]]] = {}
+        for sha in set(repo["branches"].values()):
+            by_sha[sha] = [(e["path"], blob(e.get("size") or 0))
+                           for e in fixture["trees"][sha] if e.get("type") == "blob"]
+        for br, sha in sorted(repo["branches"].items()):
+            msg = f"{br} {sha}".encode("utf-8")
+            out.append(b"commit refs/heads/%s\ncommitter mock <mock@example.com> 1700000000 +0000\n"
+                       b"data %d\n%s\n" % (br.encode("utf-8"), len(msg), msg))
+            out.extend(b"M 100644 :%d %s\n" % (mark, p.encode("utf-8")) for p, mark in by_sha[sha])
+            out.append(b"\n")
+        subprocess.run(["git", "-C", path, "fast-import", "--quiet"], input=b"".join(out), check=True)
+    return os.path.join(os.path.abspath(root), "{full_name}.git")
+
+
+class MockGitHub:
+    """Servidor HTTP em thread, com latência artificial por request."""
+
+    def __init__(
+        self,
+        orgs: List[Dict[str, Any]],
+        latency: float = 0.02,
+        error_rate: float = 0.0,
+        rate_limit: int = 5000,
+        truncate_over: int = 0,
+    ):
+        self.latency = latency
+        self.truncate_over = truncate_over
+        self._roots: Dict[str, str] = {}  # commit sha -> root tree sha
+        self._index: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}  # tree sha -> listing/flat
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._used: Counter = Counter()
+        self._rnd = random.Random(1)
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self.repos: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_full: Dict[str, Dict[str, Any]] = {}
+        self.trees: List[Mapping[str, List[Dict[str, Any]]]] = []
+        self.parents: Dict[str, str] = {}
+        self._blob_maps: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for o in orgs:
+            self.repos[o["org"]] = o["repos"]
+            for r in o["repos"]:
+                self.by_full[r["full_name"]] = r
+            self.trees.append(o["trees"])
+            self.parents.update(getattr(o["trees"], "parents", {}))
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # ---- lifecycle ----
+    def start(self) -> str:
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como a API real
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                mock._handle(self)
+
+            def do_POST(self):
+                mock._handle_graphql(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- routing ----
+    def count(self, kind: str) -> None:
+        with self._lock:
+            self.counts[kind] += 1
+
+    def _handle(self, h: BaseHTTPRequestHandler) -> None:
+        u = urlparse(h.path)
+        qs = parse_qs(u.query)
+        parts = [unquote(p) for p in u.path.strip("/").split("/")]
+        page = int(qs.get("page", ["1"])[0])
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        status, body = 404, {"message": "Not Found"}
+
+        if len(parts) == 3 and parts[0] == "orgs" and parts[2] == "repos":
+            self.count("repos")
+            repos = self.repos.get(parts[1])
+            if repos is not None:
+                status, body = 200, [_public_repo(r) for r in _page(repos, page)]
+
+        elif len(parts) >= 4 and parts[0] == "repos":
+            full = f"{parts[1]}/{parts[2]}"
+            repo = self.by_full.get(full)
+            rest = parts[3:]
+            if repo is None:
+                pass
+            elif rest == ["branches"]:
+                self.count("branches")
+                names = sorted(repo["branches"].items())
+                status, body = 200, [
+                    {"name": n, "commit": {"sha": sha}} for n, sha in _page(names, page)
+                ]
+            elif rest[:3] == ["git", "ref", "heads"]:
+                self.count("ref")
+                br = "/".join(rest[3:])
+                sha = repo["branches"].get(br)
+                if sha:
+                    status, body = 200, {"ref": f"refs/heads/{br}", "object": {"sha": sha, "type": "commit"}}
+            elif rest[:2] == ["git", "trees"] and len(rest) == 3:
+                recursive = bool(qs.get("recursive"))
+                self.count("tree" if recursive else "tree_level")
+                node = self._tree_node(rest[2])
+                if node is not None:
+                    tree, truncated = node["listing"], False
+                    if recursive:
+                        tree = node["flat"]
+                        if self.truncate_over and len(tree) > self.truncate_over:
+                            tree, truncated = tree[:self.truncate_over], True
+                    status, body = 200, {"sha": rest[2], "tree": tree, "truncated": truncated}
+            elif rest[0] == "compare" and len(rest) == 2 and "..." in rest[1]:
+                self.count("compare")
+                base, head = rest[1].split("...", 1)
+                body = self._compare(base, head)
+                if body is not None:
+                    status = 200
+
+        self._send(h, status, body)
+
+    def _flat(self, sha: str) -> Optional[List[Dict[str, Any]]]:
+        return next((t[sha] for t in self.trees if sha in t), None)
+
+    def _blobs(self, sha: Optional[str]) -> Dict[str, Dict[str, Any]]:
+        """path -> blob do commit ({} para o merge-base vazio)."""
+        if sha is None:
+            return {}
+        with self._lock:
+            blobs = self._blob_maps.get(sha)
+        if blobs is None:
+            blobs = {e["path"]: e for e in self._flat(sha) or [] if e.get("type") == "blob"}
+            with self._lock:
+                self._blob_maps[sha] = blobs
+        return blobs
+
+    def _merge_base(self, a: str, b: str) -> Optional[str]:
+        pa, pb = self.parents.get(a), self.parents.get(b)
+        if a == b or pb == a:
+            return a
+        if pa == b:
+            return b
+        if pa and pa == pb:
+            return pa
+        return None
+
+    def _compare(self, base: str, head: str) -> Optional[Dict[str, Any]]:
+        if self._flat(base) is None or self._flat(head) is None:
+            return None
+        mb = self._merge_base(base, head)
+        old, new = self._blobs(mb), self._blobs(head)
+        files = []
+        for path in sorted(set(old) | set(new)):
+            o, n = old.get(path), new.get(path)
+            if o == n:
+                continue
+            status = "added" if o is None else "removed" if n is None else "modified"
+            files.append({"filename": path, "status": status, "sha": hashlib.sha1(path.encode()).hexdigest()})
+        ahead, behind = int(mb != head), int(mb != base)
+        status = {(0, 0): "identical", (1, 0): "ahead", (0, 1): "behind"}.get((ahead, behind), "diverged")
+        return {
+            "status": status,
+            "ahead_by": ahead,
+            "behind_by": behind,
+            "merge_base_commit": {"sha": mb or ""},
+            "commits": [],
+            "files": files[:300],  # limite da API
+        }
+
+    def _tree_node(self, sha: str) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        with self._lock:
+            if sha in self._index:
+                return self._index[sha]
+            flat = next((t[sha] for t in self.trees if sha in t), None)
+            if flat is None:
+                return None
+            if sha not in self._roots:
+                blobs = [e for e in flat if e.get("type") == "blob"]
+                self._roots[sha] = _build_tree(blobs, self._index)
+            return self._index[self._roots[sha]]
+
+    def _handle_graphql(self, h: BaseHTTPRequestHandler) -> None:
+        length = int(h.headers.get("Content-Length") or 0)
+        payload = json.loads(h.rfile.read(length) or b"{}")
+        variables = payload.get("variables") or {}
+        if self.latency:
+            time.sleep(self.latency)
+        self.count("graphql")
+
+        if "org" in variables:
+            repos = self.repos.get(variables["org"])
+            if repos is None:
+                return self._send(h, 200, {"data": {"organization": None},
+                                           "errors": [{"message": "Could not resolve to an Organization"}]})
+            start = int(variables.get("cursor") or 0)
+            nodes = []
+            for r in repos[start:start + 50]:
+                nodes.append({
+                    "name": r["name"],
+                    "nameWithOwner": r["full_name"],
+                    "url": r["html_url"],
+                    "isPrivate": r["private"],
+                    "isArchived": r["archived"],
+                    "isFork": r["fork"],
+                    "pushedAt": r["pushed_at"],
+                    "owner": {"login": r["owner"]["login"]},
+                    "defaultBranchRef": {"name": r["default_branch"]},
+                    "refs": _gql_refs(r, 0),
+                })
+            end = start + len(nodes)
+            body = {"data": {"organization": {"repositories": {
+                "pageInfo": {"hasNextPage": end < len(repos), "endCursor": str(end)},
+                "nodes": nodes,
+            }}}}
+            return self._send(h, 200, body)
+
+        repo = self.by_full.get(f"{variables.get('owner')}/{variables.get('name')}")
+        if repo is None:
+            return self._send(h, 200, {"data": {"repository": None}, "errors": [{"message": "not found"}]})
+        if "e0" in variables:
+            out = {}
+            j = 0
+            while f"e{j}" in variables:
+                sha, _, path = variables[f"e{j}"].partition(":")
+                blob = self._blobs(sha).get(path)
+                out[f"b{j}"] = {"byteSize": blob.get("size") or 0} if blob else None
+                j += 1
+            return self._send(h, 200, {"data": {"repository": out}})
+        refs = _gql_refs(repo, int(variables.get("refCursor") or 0))
+        return self._send(h, 200, {"data": {"repository": {"refs": refs}}})
+
+    def _send(self, h: BaseHTTPRequestHandler, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        resource = "graphql" if h.command == "POST" else "core"
+        with self._lock:
+            self._used[resource] += 1
+            remaining = max(0, self.rate_limit - self._used[resource])
+            fail = self.error_rate and self._rnd.random() < self.error_rate
+        headers = dict(headers or {})
+        headers.update({
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(int(time.time()) + 3600),
+            "X-RateLimit-Resource": resource,
+        })
+        if fail:
+            self.count("502")
+            status, body = 502, {"message": "Server Error"}
+        raw = json.dumps(body).encode("utf-8")
+        if status == 200:
+            etag = '"%s"' % hashlib.sha1(raw).hexdigest()
+            headers["ETag"] = etag
+            if h.headers.get("If-None-Match") == etag:
+                self.count("304")
+                h.send_response(304)
+                for k, v in headers.items():
+                    h.send_header(k, v)
+                h.send_header("Content-Length", "0")
+                h.end_headers()
+                return
+        h.send_response(status)
+        h.send_header("Content-Type", "application/json")
+        h.send_header("Content-Length", str(len(raw)))
+        for k, v in headers.items():
+            h.send_header(k, v)
+        h.end_headers()
+        h.wfile.write(raw)
+
+
+def _page(items: List[Any], page: int) -> List[Any]:
+    start = (page - 1) * PER_PAGE
+    return items[start:start + PER_PAGE]
+
+
+def _build_tree(blobs: List[Dict[str, Any]], index: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> str:
+    """Agrupa blobs (paths relativos) em trees; devolve o SHA da raiz."""
+    files: List[Dict[str, Any]] = []
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for e in blobs:
+        head, sep, rest = e["path"].partition("/")
+        if sep:
+            children.setdefault(head, []).append({**e, "path": rest})
+        else:
+            files.append(e)
+
+    listing = list(files)
+    flat = list(files)
+    for name in sorted(children):
+        sub = _build_tree(children[name], index)
+        entry = {"path": name, "type": "tree", "sha": sub}
+        listing.append(entry)
+        flat.append(entry)
+        flat.extend({**x, "path": f"{name}/{x['path']}"} for x in index[sub]["flat"])
+
+    sha = hashlib.sha1(json.dumps(listing, sort_keys=True).encode("utf-8")).hexdigest()
+    index[sha] = {"listing": listing, "flat": flat}
+    return sha
+
+
+def _gql_refs(repo: Dict[str, Any], start: int) -> Dict[str, Any]:
+    items = sorted(repo["branches"].items())
+    page = items[start:start + 100]
+    end = start + len(page)
+    return {
+        "pageInfo": {"hasNextPage": end < len(items), "endCursor": str(end)},
+        "nodes": [{"name": n, "target": {"oid": sha}} for n, sha in page],
+    }
+
+
+def _public_repo(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in r.items() if k != "branches"}
+
+
+if __name__ == "__main__":
+    org = synthetic_org("mock-org")
+    mock = MockGitHub([org])
+    url = mock.start()
+    print(f"mock GitHub API at {url} (ctrl-c to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
@@ -1,31 +1,136 @@
+import argparse
 import os
 import csv
 import json
+import base64
 import time
+import hashlib
+import heapq
+import random
+import threading
+import contextvars
+import subprocess
+import zlib
 import requests
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from audit_history import AuditHistory
+from run_metrics import RunMetrics, add_cli_flags
 
 # Agora aceitamos ORGS="org1,org2,org3"
 ORGS_RAW = os.environ.get("ORGS", "").strip()
 TOKEN = os.environ.get("GH_TOKEN", "").strip()
 
-if not ORGS_RAW:
-    raise SystemExit("Missing env ORGS (comma-separated list)")
-if not TOKEN:
-    raise SystemExit("Missing env GH_TOKEN")
-
+# checagem de ORGS/GH_TOKEN fica no main(): importar o módulo (bench, mock) não sai do processo
 SLUGS = [o.strip() for o in ORGS_RAW.split(",") if o.strip()]
 
-API = "https://api.github.com"
+API = os.environ.get("GH_API_URL", "https://api.github.com").rstrip("/")
 HEADERS = {
     "Authorization": f"Bearer {TOKEN}",
     "Accept": "application/vnd.github+json",
+    "Accept-Encoding": "gzip, deflate",
     "X-GitHub-Api-Version": "2022-11-28",
 }
 
 REPORT_DIR = "reports"
-os.makedirs(REPORT_DIR, exist_ok=True)
+
+# snapshots append-only por run (audit_history.py); "" desliga
+HISTORY_DIR = os.environ.get("AUDIT_HISTORY_DIR", os.path.join(REPORT_DIR, "history")).strip()
+HISTORY = AuditHistory(HISTORY_DIR) if HISTORY_DIR else None
+RUN_AT = datetime.utcnow()
+
+# Concorrência: limite global de requests simultâneos e limite por org.
+# AUDIT_ORG_MAX_INFLIGHT=1 reproduz o crawl sequencial antigo.
+MAX_INFLIGHT = int(os.environ.get("AUDIT_MAX_INFLIGHT", "16"))
+ORG_MAX_INFLIGHT = int(os.environ.get("AUDIT_ORG_MAX_INFLIGHT", "8"))
+
+# Orgs auditadas em paralelo (cada uma com seu limite acima, todas
+# dividindo o limite global e o mesmo RequestScheduler).
+PARALLEL_ORGS = int(os.environ.get("AUDIT_PARALLEL_ORGS", "4"))
+
+# Cache persistente de stats por commit SHA (a árvore de um SHA nunca muda).
+# AUDIT_CACHE_DIR="" desliga o cache em disco (o de memória continua).
+CACHE_DIR = os.environ.get("AUDIT_CACHE_DIR", ".cache/org-audit").strip()
+
+# Entradas em memória do TREE_CACHE e do SUBTREE_CACHE (cada um); acima
+# disso saem as usadas há mais tempo (as do TREE_CACHE continuam no disco).
+MEM_CACHE_ENTRIES = int(os.environ.get("AUDIT_MEM_CACHE_ENTRIES", "2048"))
+
+# Suba quando o formato de analyze_tree mudar: invalida o cache em disco.
+ANALYZER_VERSION = 5
+
+# Extensão -> contador. AUDIT_EXT_BUCKETS (JSON) acrescenta/sobrescreve,
+# ex: '{".r": "files_r", ".jl": "files_jl"}'. Cada contador novo vira coluna.
+EXT_BUCKETS: Dict[str, str] = {
+    ".ipynb": "notebooks_ipynb",
+    ".py": "files_py",
+    ".tex": "files_tex",
+    ".md": "files_md",
+    ".yml": "files_yml",
+    ".yaml": "files_yml",
+}
+EXT_BUCKETS.update({
+    k.lower(): v for k, v in json.loads(os.environ.get("AUDIT_EXT_BUCKETS", "") or "{}").items()
+})
+BUCKET_KEYS = list(dict.fromkeys(EXT_BUCKETS.values()))
+
+# Arquivos >= este tamanho contam como candidatos a Git LFS.
+LFS_MIN_BYTES = int(float(os.environ.get("AUDIT_LFS_MIN_MB", "50")) * 1024 * 1024)
+LARGEST_FILES_TOP = int(os.environ.get("AUDIT_LARGEST_FILES", "5"))
+
+# Identifica o formato das stats (versão + configuração) no cache em disco.
+ANALYZER_KEY = "v%d-%s" % (ANALYZER_VERSION, hashlib.sha1(
+    json.dumps([sorted(EXT_BUCKETS.items()), LFS_MIN_BYTES, LARGEST_FILES_TOP]).encode("utf-8")
+).hexdigest()[:8])
+
+# Cache HTTP condicional (ETag / Last-Modified): 304 não gasta rate limit.
+# AUDIT_HTTP_CACHE_MB=0 desliga; fica em <AUDIT_CACHE_DIR>/http.
+HTTP_CACHE_MB = float(os.environ.get("AUDIT_HTTP_CACHE_MB", "50"))
+
+# Retry/backoff: GETs (e queries GraphQL, que só leem) são repetidos em
+# erros de conexão, 5xx, 429 e rate limit (primário ou secundário).
+MAX_RETRIES = int(os.environ.get("AUDIT_MAX_RETRIES", "5"))
+BACKOFF_BASE = float(os.environ.get("AUDIT_BACKOFF_BASE", "1.0"))
+BACKOFF_CAP = float(os.environ.get("AUDIT_BACKOFF_CAP", "60"))
+# Abaixo desta fração do limite, espaça os requests até o reset.
+RATE_PACE_BELOW = float(os.environ.get("AUDIT_RATE_PACE_BELOW", "0.2"))
+RATE_RESERVE = int(os.environ.get("AUDIT_RATE_RESERVE", "10"))
+
+# Backend de listagem de repos/branches: "graphql" (poucas queries paginadas,
+# já com o SHA de cada branch) ou "rest". Se o GraphQL falhar, cai no REST.
+BACKEND = os.environ.get("AUDIT_BACKEND", "graphql").strip().lower()
+
+# Modo incremental: reaproveita reports/<slug>/org-audit.ndjson da execução
+# anterior para repos (pushed_at igual) e branches (head_sha igual).
+# AUDIT_INCREMENTAL=0 força o crawl completo.
+INCREMENTAL = os.environ.get("AUDIT_INCREMENTAL", "1").strip() not in ("0", "false", "no", "")
+
+# Stats por delta: a árvore da default branch é buscada uma vez por repo e as
+# outras branches saem dela + a lista de arquivos do compare (tamanhos via
+# GraphQL). Acima de AUDIT_DELTA_MAX_FILES paths mudados busca a árvore inteira.
+BRANCH_DELTA = os.environ.get("AUDIT_BRANCH_DELTA", "0").strip() not in ("0", "false", "no", "")
+DELTA_MAX_FILES = int(os.environ.get("AUDIT_DELTA_MAX_FILES", "300"))
+# o compare devolve no máximo 300 arquivos: com isso ou mais a lista pode estar cortada
+COMPARE_FILES_MAX = 300
+# blobs por query GraphQL na busca de tamanhos
+GQL_BLOB_BATCH = 100
+
+# Backend das árvores: "api" (/git/trees por commit) ou "git" (um mirror bare
+# por repo em AUDIT_MIRROR_DIR, atualizado com git fetch; stats via ls-tree,
+# sem rate limit). A lista de repos continua vindo da API.
+TREE_BACKEND = os.environ.get("AUDIT_TREE_BACKEND", "api").strip().lower()
+# fora do AUDIT_CACHE_DIR: o workflow salva aquele diretório inteiro a cada run
+# (chave por run_id), e os clones completos iam junto toda vez
+MIRROR_DIR = os.environ.get("AUDIT_MIRROR_DIR", ".cache/org-audit-mirrors").strip()
+# {full_name} = owner/repo; um caminho local (repos bare) serve para testes sem rede
+GIT_URL = os.environ.get("AUDIT_GIT_URL", "https://github.com/{full_name}.git").strip()
+# processos git simultâneos (fetch e ls-tree), somando todas as orgs
+GIT_JOBS = int(os.environ.get("AUDIT_GIT_JOBS", "8"))
 
 ORG_MAP = {
     "academic-codex": "academic-codex",
@@ -35,22 +140,570 @@ ORG_MAP = {
 }
 
 
-def gh_get(url: str, params: Optional[dict] = None) -> requests.Response:
-    r = requests.get(url, headers=HEADERS, params=params, timeout=60)
+def make_session(pool_size: int) -> requests.Session:
+    """
+    Uma Session com pool de conexões keep-alive (TCP+TLS reaproveitados).
+    O pool acompanha o limite global de concorrência; retries ficam com o
+    RequestScheduler, não com o urllib3.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max(1, pool_size),
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+SESSION = make_session(MAX_INFLIGHT)
+
+
+class LatencyStats:
+    """Latência por request (segundos) para p50/p95/p99 no fim da execução."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples: List[float] = []
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        with self._lock:
+            xs = sorted(self._samples)
+        if not xs:
+            return 0.0
+        return xs[min(len(xs) - 1, int(round(p / 100.0 * (len(xs) - 1))))]
+
+    def summary(self) -> str:
+        ms = {p: self.percentile(p) * 1000 for p in (50, 95, 99)}
+        return (f"n={len(self._samples)} p50={ms[50]:.0f}ms p95={ms[95]:.0f}ms "
+                f"p99={ms[99]:.0f}ms pool={MAX_INFLIGHT}")
+
+
+LATENCY = LatencyStats()
+
+# spans por fase/HTTP -> reports/run-metrics.json (run_metrics.py)
+METRICS = RunMetrics("org_audit")
+
+_global_slots = threading.BoundedSemaphore(max(1, MAX_INFLIGHT))
+_org_slots: contextvars.ContextVar[Optional[threading.BoundedSemaphore]] = \
+    contextvars.ContextVar("org_slots", default=None)
+
+
+class OrgRun:
+    """Status/tempo/requests de uma org (vai para o index.json)."""
+
+    def __init__(self, slug: str, org: str):
+        self.slug = slug
+        self.org = org
+        self.status = "pending"
+        self.error = ""
+        self.duration_s = 0.0
+        self.repos = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = {
+            "org": self.org,
+            "status": self.status,
+            "duration_s": round(self.duration_s, 2),
+            "requests": self.requests,
+            "repos": self.repos,
+        }
+        if self.error:
+            d["error"] = self.error
+        return d
+
+
+_org_run: contextvars.ContextVar[Optional[OrgRun]] = contextvars.ContextVar("org_run", default=None)
+
+
+def set_max_inflight(global_limit: int, org_limit: int) -> None:
+    """Reconfigura os limites de concorrência (usado pelo benchmark)."""
+    global MAX_INFLIGHT, ORG_MAX_INFLIGHT, _global_slots, SESSION
+    MAX_INFLIGHT = max(1, global_limit)
+    ORG_MAX_INFLIGHT = max(1, org_limit)
+    _global_slots = threading.BoundedSemaphore(MAX_INFLIGHT)
+    SESSION.close()
+    SESSION = make_session(MAX_INFLIGHT)
+
+
+def pimap(
+    fn: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: int,
+    ctx: Optional[contextvars.Context] = None,
+) -> Iterator[Any]:
+    """
+    map() paralelo em threads, preservando a ordem de entrada, como gerador.
+    Só mantém ~2*workers tarefas em voo, então a memória não cresce com o
+    número de itens. Cada tarefa roda numa cópia de ctx (ou do contexto
+    atual), então o limite da org (contextvar) vale também nas threads.
+    """
+    base = ctx or contextvars.copy_context()
+    if workers <= 1:
+        for x in items:
+            yield base.copy().run(fn, x)
+        return
+
+    window = 2 * workers
+    pending: List[Future] = []
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for x in items:
+            pending.append(ex.submit(base.copy().run, fn, x))
+            if len(pending) >= window:
+                yield pending.pop(0).result()
+        while pending:
+            yield pending.pop(0).result()
+
+
+def pmap(fn: Callable[[Any], Any], items: Iterable[Any], workers: int) -> List[Any]:
+    """Versão em lista do pimap."""
+    items = list(items)
+    return list(pimap(fn, items, min(workers, len(items))))
+
+
+class HttpCache:
+    """
+    Cache em disco de respostas 200 com ETag/Last-Modified, por URL+params.
+    Um arquivo JSON por entrada; ao passar de max_bytes, remove as entradas
+    usadas há mais tempo (mtime é atualizado a cada hit). O diretório só é
+    criado na primeira gravação (importar o módulo não cria nada).
+    """
+
+    KEEP_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Link")
+
+    def __init__(self, cache_dir: Optional[str], max_bytes: int):
+        self.dir = os.path.join(cache_dir, "http") if cache_dir and max_bytes > 0 else None
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+        self.counters = {"requests": 0, "conditional": 0, "not_modified": 0, "stored": 0, "evicted": 0}
+        if self.dir and os.path.isdir(self.dir):
+            for name in os.listdir(self.dir):
+                if name.endswith(".json"):
+                    self._sizes[name] = os.path.getsize(os.path.join(self.dir, name))
+            self._evict()
+
+    @staticmethod
+    def key(url: str, params: Optional[dict]) -> str:
+        items = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        return hashlib.sha256(json.dumps([url, items]).encode("utf-8")).hexdigest() + ".json"
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        self._count("requests")
+        if not self.dir:
+            return None
+        path = os.path.join(self.dir, key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._count("conditional")
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        if not entry:
+            return {}
+        h = {}
+        if entry["headers"].get("ETag"):
+            h["If-None-Match"] = entry["headers"]["ETag"]
+        if entry["headers"].get("Last-Modified"):
+            h["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return h
+
+    def replay(self, key: str, entry: Dict[str, Any], url: str) -> requests.Response:
+        """Monta um Response 200 com o corpo cacheado (após um 304)."""
+        self._count("not_modified")
+        try:
+            os.utime(os.path.join(self.dir, key))
+        except OSError:
+            pass
+        r = requests.Response()
+        r.status_code = 200
+        r.url = url
+        r.encoding = "utf-8"
+        r.headers = CaseInsensitiveDict(entry["headers"])
+        r._content = entry["body"].encode("utf-8")
+        return r
+
+    def store(self, key: str, r: requests.Response) -> None:
+        if not self.dir or r.status_code != 200:
+            return
+        if not (r.headers.get("ETag") or r.headers.get("Last-Modified")):
+            return
+        entry = {
+            "headers": {k: r.headers[k] for k in self.KEEP_HEADERS if k in r.headers},
+            "body": r.text,
+        }
+        raw = json.dumps(entry).encode("utf-8")
+        if len(raw) > self.max_bytes:
+            return
+        path = os.path.join(self.dir, key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        os.makedirs(self.dir, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(raw)
+        os.replace(tmp, path)
+        with self._lock:
+            self._sizes[key] = len(raw)
+            self.counters["stored"] += 1
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            total = sum(self._sizes.values())
+            if total <= self.max_bytes:
+                return
+            by_age = []
+            for name in list(self._sizes):
+                try:
+                    by_age.append((os.path.getmtime(os.path.join(self.dir, name)), name))
+                except OSError:
+                    self._sizes.pop(name, None)
+            by_age.sort()
+            for _, name in by_age:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(os.path.join(self.dir, name))
+                except OSError:
+                    pass
+                total -= self._sizes.pop(name, 0)
+                self.counters["evicted"] += 1
+
+    def summary(self) -> str:
+        c = self.counters
+        n = c["requests"] or 1
+        hit = 100.0 * c["not_modified"] / (c["conditional"] or 1)
+        return (f"requests={c['requests']} conditional={c['conditional']} 304={c['not_modified']} "
+                f"(304 rate {100.0 * c['not_modified'] / n:.0f}%, hit rate {hit:.0f}%) "
+                f"stored={c['stored']} evicted={c['evicted']}")
+
+
+HTTP_CACHE = HttpCache(CACHE_DIR or None, int(HTTP_CACHE_MB * 1024 * 1024))
+
+
+class RequestScheduler:
+    """
+    Compartilhado por todas as threads/orgs:
+      - lê X-RateLimit-Remaining/Limit/Reset de cada resposta (por recurso:
+        core, graphql, ...) e espaça os próximos requests para chegar ao
+        reset sem zerar a cota;
+      - pausa global quando vem Retry-After ou rate limit secundário;
+      - decide retry com backoff exponencial com jitter.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limits: Dict[str, Dict[str, float]] = {}
+        self._pause_until = 0.0
+        self.counters = {"requests": 0, "retries": 0, "slept_s": 0.0, "failures": 0}
+
+    @staticmethod
+    def resource_for(url: str) -> str:
+        return "graphql" if url.endswith("/graphql") else "core"
+
+    def sleep(self, seconds: float, why: str) -> None:
+        if seconds <= 0:
+            return
+        if seconds >= 5:
+            print(f"[rate-limit] sleeping {seconds:.0f}s ({why})")
+        with self._lock:
+            self.counters["slept_s"] += seconds
+        with METRICS.span("sleep.backoff" if why == "backoff" else "sleep.rate_limit"):
+            time.sleep(seconds)
+
+    def before(self, resource: str) -> None:
+        """Espera o necessário antes de mandar um request."""
+        with self._lock:
+            self.counters["requests"] += 1
+            now = time.time()
+            wait = self._pause_until - now
+            st = self._limits.get(resource)
+            why = "retry-after"
+            if st and st["reset"] > now:
+                window = st["reset"] - now
+                if st["remaining"] <= RATE_RESERVE:
+                    wait, why = max(wait, window + 1), f"{resource} quota exhausted"
+                elif st["remaining"] < st["limit"] * RATE_PACE_BELOW:
+                    # reserva o próximo horário de envio: com N threads os
+                    # requests continuam saindo um a cada `pace`, não N juntos
+                    pace = window / st["remaining"]
+                    slot = max(now, st.get("next_at", 0.0))
+                    st["next_at"] = slot + pace
+                    if slot - now > wait:
+                        wait, why = slot - now, f"{resource} pacing"
+                # conta este request já, para as outras threads verem
+                st["remaining"] -= 1
+        self.sleep(wait, why)
+
+    def after(self, r: requests.Response) -> None:
+        h = r.headers
+        remaining, reset = h.get("X-RateLimit-Remaining"), h.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        resource = h.get("X-RateLimit-Resource") or self.resource_for(r.url or "")
+        try:
+            st = {"remaining": float(remaining), "reset": float(reset),
+                  "limit": float(h.get("X-RateLimit-Limit") or 5000)}
+        except ValueError:
+            return
+        with self._lock:
+            # o horário já reservado pelo before() continua valendo
+            st["next_at"] = self._limits.get(resource, {}).get("next_at", 0.0)
+            self._limits[resource] = st
+
+    def retry_delay(self, attempt: int, r: Optional[requests.Response]) -> Optional[float]:
+        """Segundos até a próxima tentativa, ou None se não vale repetir."""
+        if attempt >= MAX_RETRIES:
+            return None
+        backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+        if r is None:  # erro de conexão / timeout
+            return backoff
+
+        text = r.text.lower() if r.status_code in (403, 429) else ""
+        rate_limited = r.status_code == 429 or (r.status_code == 403 and "rate limit" in text)
+        if r.status_code not in self.RETRY_STATUS and not rate_limited:
+            return None
+
+        delay = backoff
+        retry_after = r.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        elif rate_limited and r.headers.get("X-RateLimit-Remaining") == "0":
+            reset = r.headers.get("X-RateLimit-Reset")
+            if reset and reset.isdigit():
+                delay = max(delay, int(reset) - time.time() + 5)
+        elif rate_limited:
+            # secundário sem Retry-After: a doc pede pelo menos 1 minuto
+            delay = max(delay, 60.0)
+
+        if rate_limited or retry_after:
+            with self._lock:
+                self._pause_until = max(self._pause_until, time.time() + delay)
+        return delay
+
+    def count_retry(self) -> None:
+        with self._lock:
+            self.counters["retries"] += 1
+
+    def count_failure(self) -> None:
+        with self._lock:
+            self.counters["failures"] += 1
+
+    def summary(self) -> str:
+        c = self.counters
+        return (f"requests={c['requests']} retries={c['retries']} failures={c['failures']} "
+                f"slept={c['slept_s']:.1f}s")
+
+
+SCHEDULER = RequestScheduler()
+
+
+def _http_send(
+    method: str,
+    url: str,
+    params: Optional[dict] = None,
+    extra_headers: Optional[Dict[str, str]] = None,
+    json_body: Optional[dict] = None,
+) -> requests.Response:
+    """
+    Um request com agendamento de rate limit e retry. Só faz retry de
+    métodos idempotentes (GET e as queries GraphQL, que são só leitura);
+    erros de conexão incluem reset no meio do corpo.
+    Devolve a última resposta; quem chama decide com raise_for_status().
+    """
+    resource = RequestScheduler.resource_for(url)
+    attempt = 0
+    while True:
+        SCHEDULER.before(resource)
+        run = _org_run.get()
+        if run is not None:
+            run.count_request()
+        r: Optional[requests.Response] = None
+        err: Optional[Exception] = None
+        try:
+            org_slots = _org_slots.get()
+            with _global_slots:
+                t0 = time.perf_counter()
+                if org_slots is None:
+                    r = SESSION.request(method, url, headers=extra_headers, params=params, json=json_body, timeout=60)
+                else:
+                    with org_slots:
+                        r = SESSION.request(method, url, headers=extra_headers, params=params, json=json_body, timeout=60)
+                dt = time.perf_counter() - t0
+                LATENCY.record(dt)
+            METRICS.add(f"http.{resource}", dt)
+            METRICS.count(f"http.status.{r.status_code}")
+            SCHEDULER.after(r)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            # ChunkedEncodingError: conexão resetada no meio do corpo
+            METRICS.count("http.error")
+            err = e
+
+        delay = SCHEDULER.retry_delay(attempt, r)
+        if delay is None:
+            if err is not None:
+                SCHEDULER.count_failure()
+                raise err
+            if r.status_code >= 400:
+                SCHEDULER.count_failure()
+            return r
+
+        attempt += 1
+        SCHEDULER.count_retry()
+        reason = err or f"HTTP {r.status_code}"
+        print(f"[retry] {method} {url} attempt={attempt} in {delay:.1f}s: {reason}")
+        SCHEDULER.sleep(delay, "backoff")
+
+
+def _http_get(url: str, params: Optional[dict], extra_headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    return _http_send("GET", url, params, extra_headers)
+
+
+def gh_get(url: str, params: Optional[dict] = None, cache: bool = True) -> requests.Response:
+    """
+    GET na API. Com cache=True usa requests condicionais (If-None-Match /
+    If-Modified-Since) e devolve o corpo guardado quando a resposta é 304.
+    """
+    key = entry = None
+    if cache:
+        key = HttpCache.key(url, params)
+        entry = HTTP_CACHE.lookup(key)
+    cond = HttpCache.conditional_headers(entry)
+
+    r = _http_get(url, params, cond)
 
-    # rate limit handling (basic)
-    if r.status_code == 403 and "rate limit" in r.text.lower():
-        reset = r.headers.get("X-RateLimit-Reset")
-        if reset:
-            wait = max(0, int(reset) - int(time.time()) + 5)
-            print(f"[rate-limit] sleeping {wait}s")
-            time.sleep(wait)
-            r = requests.get(url, headers=HEADERS, params=params, timeout=60)
+    if r.status_code == 304 and entry is not None:
+        return HTTP_CACHE.replay(key, entry, r.url)
 
     r.raise_for_status()
+    if cache:
+        HTTP_CACHE.store(key, r)
     return r
 
 
+def gh_graphql(query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+    """POST /graphql; levanta RuntimeError se a resposta vier com "errors"."""
+    r = _http_send("POST", f"{API}/graphql", json_body={"query": query, "variables": variables})
+    r.raise_for_status()
+    data = r.json()
+    if data.get("errors"):
+        raise RuntimeError(f"graphql errors: {data['errors']}")
+    return data.get("data") or {}
+
+
+GQL_REFS = """
+refs(refPrefix: "refs/heads/", first: 100, after: $refCursor,
+     orderBy: {field: ALPHABETICAL, direction: ASC}) {
+  pageInfo { hasNextPage endCursor }
+  nodes { name target { oid } }
+}
+"""
+
+GQL_ORG_REPOS = """
+query($org: String!, $cursor: String, $refCursor: String) {
+  organization(login: $org) {
+    repositories(first: 50, after: $cursor, orderBy: {field: NAME, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        nameWithOwner
+        url
+        isPrivate
+        isArchived
+        isFork
+        pushedAt
+        owner { login }
+        defaultBranchRef { name }
+        %s
+      }
+    }
+  }
+}
+""" % GQL_REFS
+
+GQL_REPO_REFS = """
+query($owner: String!, $name: String!, $refCursor: String) {
+  repository(owner: $owner, name: $name) {
+    %s
+  }
+}
+""" % GQL_REFS
+
+
+def _gql_branch_heads(refs: Dict[str, Any]) -> List[Tuple[str, Optional[str]]]:
+    return [
+        (n["name"], (n.get("target") or {}).get("oid"))
+        for n in refs.get("nodes") or []
+        if n and n.get("name")
+    ]
+
+
+def list_org_repos_graphql(org: str) -> List[Dict[str, Any]]:
+    """
+    Repos da org no mesmo formato do REST, com "_branch_heads" = [(branch, sha)].
+    Repos com mais de 100 branches fazem queries extras só para os refs.
+    """
+    repos: List[Dict[str, Any]] = []
+    cursor = None
+    while True:
+        data = gh_graphql(GQL_ORG_REPOS, {"org": org, "cursor": cursor, "refCursor": None})
+        conn = (data.get("organization") or {}).get("repositories") or {}
+        for n in conn.get("nodes") or []:
+            if not n:
+                continue
+            owner = (n.get("owner") or {}).get("login") or org
+            refs = n.get("refs") or {}
+            heads = _gql_branch_heads(refs)
+            page = refs.get("pageInfo") or {}
+            while page.get("hasNextPage"):
+                more = gh_graphql(GQL_REPO_REFS, {
+                    "owner": owner, "name": n["name"], "refCursor": page.get("endCursor"),
+                })
+                refs = (more.get("repository") or {}).get("refs") or {}
+                heads.extend(_gql_branch_heads(refs))
+                page = refs.get("pageInfo") or {}
+
+            repos.append({
+                "name": n["name"],
+                "full_name": n.get("nameWithOwner") or f"{owner}/{n['name']}",
+                "html_url": n.get("url") or "",
+                "owner": {"login": owner},
+                "private": bool(n.get("isPrivate")),
+                "archived": bool(n.get("isArchived")),
+                "fork": bool(n.get("isFork")),
+                "default_branch": (n.get("defaultBranchRef") or {}).get("name") or "",
+                "pushed_at": n.get("pushedAt") or "",
+                "_branch_heads": heads,
+            })
+
+        info = conn.get("pageInfo") or {}
+        if not info.get("hasNextPage"):
+            break
+        cursor = info.get("endCursor")
+    return repos
+
+
 def list_org_repos(org: str) -> List[Dict[str, Any]]:
     repos = []
     page = 1
@@ -72,7 +725,13 @@ def list_org_repos(org: str) -> List[Dict[str, Any]]:
 
 def list_branches(owner: str, repo: str) -> List[str]:
     """Lista todas as branches existentes no repo (sem suposições)."""
-    branches: List[str] = []
+    return [name for name, _ in list_branch_heads(owner, repo)]
+
+
+@METRICS.traced("list_branches")
+def list_branch_heads(owner: str, repo: str) -> List[Tuple[str, Optional[str]]]:
+    """[(branch, head_sha)]: a listagem já traz commit.sha, sem /git/ref por branch."""
+    branches: List[Tuple[str, Optional[str]]] = []
     page = 1
     while True:
         r = gh_get(f"{API}/repos/{owner}/{repo}/branches", params={
@@ -82,7 +741,10 @@ def list_branches(owner: str, repo: str) -> List[str]:
         batch = r.json()
         if not batch:
             break
-        branches.extend(b.get("name") for b in batch if b.get("name"))
+        branches.extend(
+            (b["name"], (b.get("commit") or {}).get("sha"))
+            for b in batch if b.get("name")
+        )
         page += 1
     return branches
 
@@ -98,248 +760,1349 @@ def get_branch_head_sha(owner: str, repo: str, branch: str) -> Optional[str]:
         return None
 
 
-def get_tree(owner: str, repo: str, sha: str) -> Optional[List[Dict[str, Any]]]:
+@METRICS.traced("get_tree")
+def get_tree_data(owner: str, repo: str, sha: str, recursive: bool = True) -> Optional[Dict[str, Any]]:
+    """Resposta crua de /git/trees/{sha} ({"tree": [...], "truncated": bool})."""
     url = f"{API}/repos/{owner}/{repo}/git/trees/{sha}"
     try:
-        r = gh_get(url, params={"recursive": 1})
-        data = r.json()
-        return data.get("tree", [])
+        # árvores por SHA já ficam no ShaCache; não vale duplicar no cache HTTP
+        r = gh_get(url, params={"recursive": 1} if recursive else None, cache=False)
+        return r.json()
     except requests.HTTPError as e:
         print(f"[warn] tree not found {owner}/{repo}: {e}")
         return None
 
 
-def analyze_tree(tree: List[Dict[str, Any]]) -> Dict[str, Any]:
-    paths = [n.get("path", "") for n in tree if n.get("type") == "blob"]
-    lower = [p.lower() for p in paths]
+def get_tree(owner: str, repo: str, sha: str) -> Optional[List[Dict[str, Any]]]:
+    data = get_tree_data(owner, repo, sha)
+    return None if data is None else data.get("tree", [])
+
 
-    has_gitignore = ".gitignore" in lower
-    has_readme = any(p.startswith("readme") for p in lower)  # README, README.md, etc
+@METRICS.traced("compare")
+def compare_commits(owner: str, repo: str, base: str, head: str) -> Optional[Dict[str, Any]]:
+    """GET /compare/{base}...{head}: status, behind_by e files (do merge-base até head)."""
+    url = f"{API}/repos/{owner}/{repo}/compare/{base}...{head}"
+    try:
+        # só os files interessam: per_page=1 corta a lista de commits
+        r = gh_get(url, params={"per_page": 1}, cache=False)
+        return r.json()
+    except requests.HTTPError as e:
+        print(f"[warn] compare failed {owner}/{repo} {base[:7]}...{head[:7]}: {e}")
+        return None
 
-    ipynb = sum(1 for p in lower if p.endswith(".ipynb"))
-    py = sum(1 for p in lower if p.endswith(".py"))
-    tex = sum(1 for p in lower if p.endswith(".tex"))
-    md = sum(1 for p in lower if p.endswith(".md"))
-    yml = sum(1 for p in lower if p.endswith(".yml") or p.endswith(".yaml"))
 
-    return {
+@METRICS.traced("blob_sizes")
+def blob_sizes(owner: str, repo: str, exprs: List[str]) -> Dict[str, Optional[int]]:
+    """
+    "<commit>:<path>" -> byteSize, via GraphQL (GQL_BLOB_BATCH por query).
+    None quando o path não existe naquele commit ou não é um blob.
+    """
+    out: Dict[str, Optional[int]] = {}
+    for i in range(0, len(exprs), GQL_BLOB_BATCH):
+        chunk = exprs[i:i + GQL_BLOB_BATCH]
+        decl = "".join(f", $e{j}: String!" for j in range(len(chunk)))
+        fields = "\n".join(f"b{j}: object(expression: $e{j}) {{ ... on Blob {{ byteSize }} }}" for j in range(len(chunk)))
+        query = f"query($owner: String!, $name: String!{decl}) {{\n repository(owner: $owner, name: $name) {{\n{fields}\n }}\n}}"
+        variables: Dict[str, Any] = {"owner": owner, "name": repo}
+        variables.update((f"e{j}", e) for j, e in enumerate(chunk))
+        data = gh_graphql(query, variables).get("repository") or {}
+        for j, e in enumerate(chunk):
+            out[e] = (data.get(f"b{j}") or {}).get("byteSize")
+    return out
+
+
+def _evict_done(mem: "OrderedDict[str, Future]", limit: int) -> int:
+    """
+    Tira de mem (LRU: mais antigo primeiro) as entradas já resolvidas até
+    caber em limit; as em cálculo ficam (tem thread esperando). Chamar com
+    o lock do cache. Devolve quantas saíram.
+    """
+    over = len(mem) - limit
+    if over <= 0:
+        return 0
+    victims = []
+    for sha, fut in mem.items():
+        if len(victims) >= over:
+            break
+        if fut.done():
+            victims.append(sha)
+    for sha in victims:
+        del mem[sha]
+    return len(victims)
+
+
+class SubtreeCache:
+    """
+    Subárvores já expandidas, por SHA da tree (em memória, por execução,
+    no máximo MEM_CACHE_ENTRIES). Diretórios idênticos (mesmo SHA) em
+    branches/repos diferentes são buscados uma vez só; pedidos simultâneos
+    do mesmo SHA esperam o primeiro.
+    """
+
+    def __init__(self, max_entries: int = MEM_CACHE_ENTRIES):
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[str, Future]" = OrderedDict()
+        self.max_entries = max_entries
+        self.counters = {"fetched": 0, "hits": 0, "evicted": 0}
+
+    def get_or_compute(
+        self, sha: str, compute: Callable[[], Tuple[List[Dict[str, Any]], bool]]
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        with self._lock:
+            fut = self._mem.get(sha)
+            owner = fut is None
+            if owner:
+                fut = self._mem[sha] = Future()
+                self.counters["fetched"] += 1
+                self.counters["evicted"] += _evict_done(self._mem, self.max_entries)
+            else:
+                self._mem.move_to_end(sha)
+                self.counters["hits"] += 1
+        if not owner:
+            return fut.result()
+
+        ok = False
+        try:
+            result = compute()
+            ok = result[1]
+            fut.set_result(result)
+            return result
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            if not ok:  # parcial/falha: deixa tentar de novo
+                with self._lock:
+                    self._mem.pop(sha, None)
+
+    def summary(self) -> str:
+        c = self.counters
+        return f"fetched={c['fetched']} hits={c['hits']} evicted={c['evicted']}"
+
+
+SUBTREE_CACHE = SubtreeCache()
+
+
+def expand_tree(
+    owner: str, repo: str, sha: str, try_recursive: bool = True
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Lista recursiva de uma tree que o GitHub devolveu com truncated=true.
+    Busca o nível atual sem recursive e expande cada subárvore em paralelo
+    (primeiro tentando recursive nela; se vier truncada de novo, desce mais
+    um nível). Retorna (entradas com path completo, completo?).
+    """
+    if try_recursive:
+        data = get_tree_data(owner, repo, sha, recursive=True)
+        if data is None:
+            return [], False
+        if not data.get("truncated"):
+            return data.get("tree", []), True
+
+    data = get_tree_data(owner, repo, sha, recursive=False)
+    if data is None:
+        return [], False
+
+    entries = list(data.get("tree", []))
+    subtrees = [e for e in entries if e.get("type") == "tree" and e.get("sha")]
+
+    def one(e: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+        return SUBTREE_CACHE.get_or_compute(e["sha"], lambda: expand_tree(owner, repo, e["sha"]))
+
+    complete = not data.get("truncated")
+    for e, (sub, ok) in zip(subtrees, pmap(one, subtrees, ORG_MAX_INFLIGHT)):
+        complete = complete and ok
+        prefix = e.get("path", "") + "/"
+        entries.extend({**x, "path": prefix + x.get("path", "")} for x in sub)
+    return entries, complete
+
+
+def pack_path_set(paths: List[str]) -> str:
+    """
+    Paths separados por NUL (não aparece em path do git), zlib e base64.
+    Um join e um compress em C por árvore, sem nada por path em Python;
+    paths de um repo têm prefixos longos em comum e comprimem bem.
+    """
+    return base64.b64encode(zlib.compress("\0".join(paths).encode("utf-8"), 1)).decode("ascii")
+
+
+def unpack_path_set(packed: str) -> List[bytes]:
+    # bytes mesmo: a união não precisa decodificar
+    return zlib.decompress(base64.b64decode(packed)).split(b"\0")
+
+
+def unique_stats(path_sets: Iterable[Dict[str, str]]) -> Dict[str, int]:
+    """
+    Contagens exatas por repo: união dos paths de todas as branches
+    (path_sets de analyze_tree), por contador e no total.
+    """
+    union: Dict[str, set] = {}
+    for ps in path_sets:
+        for bucket, packed in ps.items():
+            union.setdefault(bucket, set()).update(unpack_path_set(packed))
+    out = {f"unique_{k}": len(union.get(k, ())) for k in BUCKET_KEYS}
+    # cada path cai num contador só: o total é a soma
+    out["unique_total_files"] = sum(len(x) for x in union.values())
+    return out
+
+
+@METRICS.traced("analyze_tree")
+def analyze_tree(tree: List[Dict[str, Any]], path_sets: bool = False) -> Dict[str, Any]:
+    """
+    Uma passada só pela árvore: cada blob é classificado pela extensão
+    (lookup em EXT_BUCKETS) e tem o size somado no total e no bucket.
+    Além dos contadores de empty_stats(), devolve:
+      - bytes_by_bucket: bytes por contador (+ "other")
+      - largest_files: os LARGEST_FILES_TOP maiores blobs
+      - path_sets (só com path_sets=True): paths por contador (+ "other")
+        em pack_path_set, para unique_stats() unir as branches; não vai
+        para o relatório
+    """
+    buckets_get = EXT_BUCKETS.get
+    counts = dict.fromkeys(BUCKET_KEYS, 0)
+    bucket_bytes = dict.fromkeys(BUCKET_KEYS + ["other"], 0)
+    bucket_paths: Dict[str, List[str]] = {k: [] for k in BUCKET_KEYS + ["other"]}
+    other_paths = bucket_paths["other"]
+    keep = path_sets
+    other_bytes = 0
+    has_gitignore = has_readme = False
+    total = total_bytes = lfs = 0
+    largest: List[Tuple[int, str]] = []  # min-heap (size, path)
+    top = LARGEST_FILES_TOP
+    floor = -1  # menor size no heap quando cheio
+    lfs_min = LFS_MIN_BYTES
+
+    for n in tree:
+        if n.get("type") != "blob":
+            continue
+        path = n.get("path", "")
+        size = n.get("size") or 0
+        total += 1
+        total_bytes += size
+
+        # extensão = depois do último "." do nome (não do diretório)
+        dot = path.rfind(".")
+        bucket = buckets_get(path[dot:].lower()) if dot > path.rfind("/") else None
+        if bucket is None:
+            other_bytes += size
+            if keep:
+                other_paths.append(path)
+        else:
+            counts[bucket] += 1
+            bucket_bytes[bucket] += size
+            if keep:
+                bucket_paths[bucket].append(path)
+
+        if size > floor:
+            if size >= lfs_min:
+                lfs += 1
+            if len(largest) < top:
+                heapq.heappush(largest, (size, path))
+                if len(largest) == top:
+                    floor = largest[0][0]
+            elif top:
+                heapq.heapreplace(largest, (size, path))
+                floor = largest[0][0]
+        elif size >= lfs_min:
+            lfs += 1
+
+        # .gitignore e README, README.md, etc (comparação sem caixa)
+        if path[:1] in ".rR":
+            p = path.lower()
+            if p == ".gitignore":
+                has_gitignore = True
+            elif p.startswith("readme"):
+                has_readme = True
+
+    bucket_bytes["other"] = other_bytes
+    out = {
         "has_gitignore": has_gitignore,
         "has_readme": has_readme,
-        "notebooks_ipynb": ipynb,
-        "files_py": py,
-        "files_tex": tex,
-        "files_md": md,
-        "files_yml": yml,
-        "total_files": len(paths),
+        **counts,
+        "total_files": total,
+        "total_bytes": total_bytes,
+        "lfs_candidates": lfs,
+        "bytes_by_bucket": bucket_bytes,
+        "largest_files": [{"path": p, "size": sz} for sz, p in sorted(largest, reverse=True)],
     }
+    if path_sets:
+        out["path_sets"] = {k: pack_path_set(v) for k, v in bucket_paths.items() if v}
+    return out
+
+
+class ShaCache:
+    """
+    Stats de analyze_tree por commit SHA.
+      - memória: cada SHA é buscado/analisado uma vez por execução, mesmo
+        com várias branches (ou forks) pedindo o mesmo SHA ao mesmo tempo;
+        no máximo max_entries (LRU), o resto volta do disco se precisar;
+      - disco: <cache_dir>/trees-<ANALYZER_KEY>/<sha[:2]>/<sha>.json
+    Falhas (get_tree -> None) não são cacheadas. Quem pede path_sets e
+    acha uma entrada sem eles calcula de novo (a entrada nova serve aos dois).
+    """
+
+    def __init__(self, cache_dir: Optional[str], max_entries: int = MEM_CACHE_ENTRIES):
+        self.dir = os.path.join(cache_dir, f"trees-{ANALYZER_KEY}") if cache_dir else None
+        self._mem: "OrderedDict[str, Future]" = OrderedDict()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.counters = {"fetched": 0, "memory_hits": 0, "disk_hits": 0, "evicted": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] += 1
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.dir, sha[:2], f"{sha}.json")
+
+    def _load(self, sha: str) -> Optional[Dict[str, Any]]:
+        if not self.dir:
+            return None
+        try:
+            with open(self._path(sha), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, sha: str, stats: Dict[str, Any]) -> None:
+        if not self.dir:
+            return
+        path = self._path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp, path)
+
+    def get_or_compute(
+        self, sha: str, compute: Callable[[], Tuple[Dict[str, Any], bool]], path_sets: bool = False
+    ) -> Dict[str, Any]:
+        """compute() -> (stats, ok); ok=False quando a árvore não veio."""
+        with self._lock:
+            fut = self._mem.get(sha)
+            if path_sets and fut is not None and fut.done() and "path_sets" not in fut.result():
+                fut = None
+            owner = fut is None
+            if owner:
+                fut = self._mem[sha] = Future()
+                self._mem.move_to_end(sha)
+                self.counters["evicted"] += _evict_done(self._mem, self.max_entries)
+            else:
+                self._mem.move_to_end(sha)
+                self.counters["memory_hits"] += 1
+        if not owner:
+            stats = fut.result()
+            if path_sets and "path_sets" not in stats:
+                # outro repo calculou este SHA sem path_sets ao mesmo tempo
+                return self.get_or_compute(sha, compute, path_sets)
+            return dict(stats)
+
+        try:
+            stats = self._load(sha)
+            if path_sets and stats is not None and "path_sets" not in stats:
+                stats = None
+            ok = True
+            if stats is not None:
+                self._count("disk_hits")
+            else:
+                self._count("fetched")
+                stats, ok = compute()
+                if ok:
+                    self._store(sha, stats)
+            fut.set_result(stats)
+        except BaseException as e:
+            fut.set_exception(e)
+            ok = False
+            raise
+        finally:
+            if not ok:
+                with self._lock:
+                    self._mem.pop(sha, None)
+        return dict(stats)
+
+    def peek(self, sha: str) -> Optional[Dict[str, Any]]:
+        """Stats já calculadas (memória ou disco), sem buscar nada."""
+        with self._lock:
+            fut = self._mem.get(sha)
+        if fut is not None and fut.done():
+            return dict(fut.result())
+        return self._load(sha)
+
+    def has(self, sha: str) -> bool:
+        """Já calculado (ou em cálculo) nesta execução, ou no disco."""
+        with self._lock:
+            if sha in self._mem:
+                return True
+        return bool(self.dir) and os.path.exists(self._path(sha))
+
+    def summary(self) -> str:
+        c = self.counters
+        return (f"fetched={c['fetched']} memory_hits={c['memory_hits']} disk_hits={c['disk_hits']} "
+                f"evicted={c['evicted']}")
+
+
+TREE_CACHE = ShaCache(CACHE_DIR or None)
+
+
+def fetch_full_tree(owner: str, repo: str, sha: str) -> Optional[Tuple[List[Dict[str, Any]], bool, bool]]:
+    """
+    (entradas, tree_truncated, tree_complete) do commit: tree_truncated = o
+    GitHub cortou a lista recursiva; tree_complete = as entradas cobrem a
+    árvore inteira. None se a árvore não veio.
+    """
+    data = get_tree_data(owner, repo, sha)
+    if data is None:
+        return None
+
+    tree = data.get("tree", [])
+    truncated = bool(data.get("truncated"))
+    complete = True
+    if truncated:
+        print(f"[tree] truncated {owner}/{repo}@{sha[:7]}: walking subtrees")
+        with METRICS.span("expand_tree"):
+            tree, complete = expand_tree(owner, repo, sha, try_recursive=False)
+        if not complete:
+            print(f"[warn] partial tree {owner}/{repo}@{sha[:7]}")
+    return tree, truncated, complete
+
+
+class DeltaBase:
+    """
+    Árvore da default branch de um repo, base das stats por delta
+    (AUDIT_BRANCH_DELTA). Só é buscada quando a primeira branch precisa.
+
+    stats_for(sha) monta a árvore da branch trocando na base os paths que o
+    compare diz que mudaram (dos dois lados do merge-base, então branches
+    divergentes também servem) e roda analyze_tree nela: mesmo resultado da
+    árvore completa. Devolve None quando o delta não serve (compare falhou,
+    diff grande demais, base incompleta) e a branch busca a árvore inteira.
+    """
+
+    def __init__(self, owner: str, repo: str, sha: str):
+        self.owner = owner
+        self.repo = repo
+        self.sha = sha
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._blobs: Optional[Dict[str, Dict[str, Any]]] = None
+        self._truncated = False
+
+    def _tree(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                full = fetch_full_tree(self.owner, self.repo, self.sha)
+                if full is not None and full[2]:
+                    self._truncated = full[1]
+                    self._blobs = {e["path"]: e for e in full[0] if e.get("type") == "blob" and e.get("path")}
+            return self._blobs
+
+    def _changed_paths(self, sha: str) -> Optional[Dict[str, bool]]:
+        """path -> True (ver no commit) / False (sabidamente removido); None = delta não serve."""
+        fwd = compare_commits(self.owner, self.repo, self.sha, sha)
+        if fwd is None:
+            return None
+        sides = [fwd.get("files") or []]
+        if fwd.get("behind_by"):
+            # a default andou depois do merge-base: os paths que ela mudou também diferem
+            back = compare_commits(self.owner, self.repo, sha, self.sha)
+            if back is None:
+                return None
+            sides.append(back.get("files") or [])
+        if any(len(files) >= COMPARE_FILES_MAX for files in sides):
+            return None
+
+        paths: Dict[str, bool] = {}
+        for f in sides[0]:
+            if f.get("previous_filename"):
+                paths.setdefault(f["previous_filename"], False)
+            paths[f["filename"]] = f.get("status") != "removed"
+        if len(sides) > 1:
+            # o estado no merge-base não vem no compare: pergunta tudo ao commit
+            paths = dict.fromkeys(paths, True)
+            for f in sides[1]:
+                paths[f["filename"]] = True
+                if f.get("previous_filename"):
+                    paths[f["previous_filename"]] = True
+        if len(paths) > DELTA_MAX_FILES:
+            return None
+        return paths
+
+    def stats_for(self, sha: str, path_sets: bool = False) -> Optional[Dict[str, Any]]:
+        blobs = self._tree()
+        if blobs is None:
+            return None
+        if sha == self.sha:
+            return {**analyze_tree(list(blobs.values()), path_sets), "tree_truncated": self._truncated,
+                    "tree_complete": True}
+
+        with METRICS.span("delta"):
+            paths = self._changed_paths(sha)
+            if paths is None:
+                METRICS.count("delta.fallback")
+                print(f"[delta] {self.owner}/{self.repo}@{sha[:7]}: diff too large or unavailable, fetching tree")
+                return None
+            asked = [p for p, present in paths.items() if present]
+            sizes = blob_sizes(self.owner, self.repo, [f"{sha}:{p}" for p in asked])
+
+            tree = dict(blobs)
+            for p in paths:
+                size = sizes.get(f"{sha}:{p}")
+                if size is None:
+                    tree.pop(p, None)
+                else:
+                    tree[p] = {"path": p, "type": "blob", "size": size}
+            METRICS.count("delta.branches")
+            METRICS.count("delta.paths", len(paths))
+            return {**analyze_tree(list(tree.values()), path_sets), "tree_truncated": False, "tree_complete": True}
+
+
+class GitMirrors:
+    """
+    Mirrors bare locais (<root>/<owner>/<repo>.git), só com refs/heads.
+    Sem --filter=blob:none: o ls-tree --long precisa dos blobs para o
+    tamanho e, num clone parcial, buscaria cada um sob demanda. Depois do
+    primeiro fetch, os seguintes só trazem objetos novos.
+    """
+
+    def __init__(self, root: str, url_template: str, jobs: int):
+        self.root = root
+        self.url_template = url_template
+        self._slots = threading.BoundedSemaphore(max(1, jobs))
+
+    def _git(self, args: List[str], auth: bool = False) -> bytes:
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        if auth and TOKEN and self.url_template.startswith("https://"):
+            # pelo ambiente (GIT_CONFIG_*, git >= 2.31): não aparece na lista de
+            # processos como um -c apareceria, nem fica no config do mirror
+            basic = base64.b64encode(f"x-access-token:{TOKEN}".encode("utf-8")).decode("ascii")
+            n = int(env.get("GIT_CONFIG_COUNT") or 0)
+            env.update({
+                "GIT_CONFIG_COUNT": str(n + 1),
+                f"GIT_CONFIG_KEY_{n}": "http.extraHeader",
+                f"GIT_CONFIG_VALUE_{n}": f"Authorization: Basic {basic}",
+            })
+        with self._slots:
+            return subprocess.run(["git"] + args, check=True, capture_output=True, env=env).stdout
+
+    def path(self, full_name: str) -> str:
+        return os.path.join(self.root, f"{full_name}.git")
+
+    @METRICS.traced("git.fetch")
+    def sync(self, full_name: str) -> str:
+        """Cria o mirror se preciso e traz as branches; devolve o caminho."""
+        path = self.path(full_name)
+        if os.path.isdir(os.path.join(path, "objects")):
+            self._git(["-C", path, "fetch", "--prune", "--no-tags", "--quiet", "origin"], auth=True)
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        # clone --bare já traz refs/heads/* como estão; o refspec vale para os fetches seguintes
+        self._git(["clone", "--bare", "--no-tags", "--quiet",
+                   self.url_template.format(full_name=full_name), tmp], auth=True)
+        self._git(["-C", tmp, "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*"])
+        # clone interrompido não deixa mirror pela metade
+        os.replace(tmp, path)
+        return path
+
+    def heads(self, path: str) -> List[Tuple[str, Optional[str]]]:
+        out = self._git(["-C", path, "for-each-ref", "--format=%(objectname) %(refname:strip=2)", "refs/heads"])
+        heads: List[Tuple[str, Optional[str]]] = []
+        for line in out.decode("utf-8", "replace").splitlines():
+            sha, _, name = line.partition(" ")
+            if name:
+                heads.append((name, sha))
+        return heads
+
+    @METRICS.traced("git.ls_tree")
+    def tree(self, path: str, sha: str) -> List[Dict[str, Any]]:
+        """Entradas no formato do /git/trees?recursive=1 (sem as trees, que o analyze_tree ignora)."""
+        out = self._git(["-C", path, "ls-tree", "-r", "--long", "-z", sha])
+        entries = []
+        for rec in out.split(b"\0"):
+            if not rec:
+                continue
+            meta, _, name = rec.partition(b"\t")
+            _, kind, oid, size = meta.split()
+            entries.append({
+                "path": name.decode("utf-8", "replace"),
+                "type": kind.decode("ascii"),
+                "sha": oid.decode("ascii"),
+                "size": int(size) if size != b"-" else 0,
+            })
+        return entries
+
+
+MIRRORS = GitMirrors(MIRROR_DIR, GIT_URL, GIT_JOBS)
+
+
+def git_stats_for_sha(mirror: str, sha: str, path_sets: bool = False) -> Dict[str, Any]:
+    """stats_for_sha lendo a árvore do mirror local (mesmo TREE_CACHE)."""
+    def compute() -> Tuple[Dict[str, Any], bool]:
+        try:
+            tree = MIRRORS.tree(mirror, sha)
+        except subprocess.CalledProcessError as e:
+            print(f"[warn] ls-tree failed {mirror}@{sha[:7]}: {e.stderr.decode('utf-8', 'replace').strip()}")
+            return {**analyze_tree([], path_sets), "tree_truncated": False, "tree_complete": False}, False
+        return {**analyze_tree(tree, path_sets), "tree_truncated": False, "tree_complete": True}, True
+
+    return TREE_CACHE.get_or_compute(sha, compute, path_sets)
+
+
+def stats_for_sha(
+    owner: str, repo: str, sha: str, base: Optional[DeltaBase] = None, path_sets: bool = False,
+) -> Dict[str, Any]:
+    """
+    analyze_tree do commit, com tree_truncated e tree_complete (ver
+    fetch_full_tree). Com base, tenta primeiro o delta contra a default.
+    """
+    def compute() -> Tuple[Dict[str, Any], bool]:
+        if base is not None:
+            stats = base.stats_for(sha, path_sets)
+            if stats is not None:
+                return stats, True
+
+        full = fetch_full_tree(owner, repo, sha)
+        if full is None:
+            return {**analyze_tree([], path_sets), "tree_truncated": False, "tree_complete": False}, False
+        tree, truncated, complete = full
+        return {**analyze_tree(tree, path_sets), "tree_truncated": truncated, "tree_complete": complete}, complete
+
+    return TREE_CACHE.get_or_compute(sha, compute, path_sets)
+
+
+class IncrementalStats:
+    """Contadores do modo incremental (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.repos_reused = 0
+        self.branches_reused = 0
+        self.calls_saved = 0
+
+    def repo(self, branches_count: int) -> None:
+        # REST: páginas de /branches (+ a vazia final) e uma tree por branch
+        pages = branches_count // 100 + 1 if BACKEND == "rest" else 0
+        with self._lock:
+            self.repos_reused += 1
+            self.branches_reused += branches_count
+            self.calls_saved += pages + branches_count
+
+    def branch(self) -> None:
+        with self._lock:
+            self.branches_reused += 1
+            self.calls_saved += 1
+
+    def refetched(self) -> None:
+        # branch reaproveitada cuja árvore teve que ser buscada de novo (path_sets)
+        with self._lock:
+            self.calls_saved -= 1
+
+    def summary(self) -> str:
+        return (f"repos_reused={self.repos_reused} branches_reused={self.branches_reused} "
+                f"api_calls_saved~{self.calls_saved}")
+
+
+INCREMENTAL_STATS = IncrementalStats()
+
+
+def path_sets_file(slug: str) -> Optional[str]:
+    """
+    <AUDIT_CACHE_DIR>/paths-<ANALYZER_KEY>/<slug>.ndjson: path_sets por head_sha
+    dos repos com mais de um SHA. Fica no cache e não em reports/ (listagem de
+    arquivos de todas as branches, inclusive de repos privados; nenhuma
+    página lê). None com o cache em disco desligado.
+    """
+    return os.path.join(CACHE_DIR, f"paths-{ANALYZER_KEY}", f"{slug}.ndjson") if CACHE_DIR else None
+
+
+class PreviousRows:
+    """
+    Linhas da execução anterior por full_name, lidas sob demanda do
+    org-audit.ndjson, com os "path_sets" do path_sets_file de volta em cada
+    linha. Em memória fica só o offset de cada linha nos dois arquivos,
+    não as linhas (com as branches) nem os path_sets.
+    """
+
+    def __init__(self, slug: str):
+        self.path = os.path.join(REPORT_DIR, slug, "org-audit.ndjson")
+        self.sets_path = path_sets_file(slug)
+        self._rows = self._index(self.path)
+        # sem os path_sets, as árvores das branches reaproveitadas são buscadas de novo
+        self._sets = self._index(self.sets_path) if self.sets_path else {}
+
+    @staticmethod
+    def _index(path: str) -> Dict[str, int]:
+        """full_name -> offset da linha ({} se o arquivo não existir ou estiver corrompido)."""
+        out: Dict[str, int] = {}
+        try:
+            with open(path, "rb") as f:
+                pos = 0
+                for line in f:
+                    if line.strip():
+                        r = json.loads(line)
+                        if isinstance(r, dict) and r.get("full_name"):
+                            out[r["full_name"]] = pos
+                    pos += len(line)
+        except (OSError, ValueError):
+            return {}
+        return out
+
+    @staticmethod
+    def _read(path: str, offset: int) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, full_name: str) -> Optional[Dict[str, Any]]:
+        offset = self._rows.get(full_name)
+        if offset is None:
+            return None
+        row = self._read(self.path, offset)
+        if row is None:
+            return None
+        if full_name in self._sets:
+            sets = self._read(self.sets_path, self._sets[full_name]) or {}
+            if isinstance(sets.get("path_sets"), dict):
+                row["path_sets"] = sets["path_sets"]
+        return row
+
+
+def _reusable(report: Optional[Dict[str, Any]]) -> bool:
+    # só reaproveita se o formato das stats for o atual
+    return bool(report) and all(k in report for k in empty_branch_stats())
 
 
 def empty_stats() -> Dict[str, Any]:
+    """Contadores escalares (por repo e por branch; viram colunas no CSV)."""
     return {
         "has_gitignore": False,
         "has_readme": False,
-        "notebooks_ipynb": 0,
-        "files_py": 0,
-        "files_tex": 0,
-        "files_md": 0,
-        "files_yml": 0,
+        **dict.fromkeys(BUCKET_KEYS, 0),
         "total_files": 0,
+        "total_bytes": 0,
+        "lfs_candidates": 0,
+    }
+
+
+def empty_branch_stats() -> Dict[str, Any]:
+    """empty_stats() + o detalhe que só existe por branch."""
+    return {
+        **empty_stats(),
+        "bytes_by_bucket": dict.fromkeys(BUCKET_KEYS + ["other"], 0),
+        "largest_files": [],
+        "tree_truncated": False,
+        "tree_complete": False,
     }
 
 
 def aggregate_repo_stats(branch_reports: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Agrega métricas por repo a partir das branches.
-    Sem deduplicar arquivos (pode contar duas vezes entre branches),
-    mas é OK para auditoria estrutural.
+    Sem deduplicar arquivos (pode contar duas vezes entre branches); as
+    contagens exatas ficam nos unique_* (unique_stats). Mantido pelos
+    consumidores antigos do CSV/JSON.
     """
-    if not branch_reports:
-        return empty_stats()
-
     agg = empty_stats()
-    agg["has_gitignore"] = any(b.get("has_gitignore") for b in branch_reports)
-    agg["has_readme"] = any(b.get("has_readme") for b in branch_reports)
-
-    agg["notebooks_ipynb"] = sum(int(b.get("notebooks_ipynb", 0)) for b in branch_reports)
-    agg["files_py"] = sum(int(b.get("files_py", 0)) for b in branch_reports)
-    agg["files_tex"] = sum(int(b.get("files_tex", 0)) for b in branch_reports)
-    agg["files_md"] = sum(int(b.get("files_md", 0)) for b in branch_reports)
-    agg["files_yml"] = sum(int(b.get("files_yml", 0)) for b in branch_reports)
-    agg["total_files"] = sum(int(b.get("total_files", 0)) for b in branch_reports)
+    for k, v in agg.items():
+        if isinstance(v, bool):
+            agg[k] = any(b.get(k) for b in branch_reports)
+        else:
+            agg[k] = sum(int(b.get(k, 0)) for b in branch_reports)
     return agg
 
 
-def audit_one_repo(owner: str, repo_name: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+def audit_one_repo(
+    owner: str,
+    repo_name: str,
+    previous: Optional[List[Dict[str, Any]]] = None,
+    heads: Optional[List[Tuple[str, Optional[str]]]] = None,
+    default_branch: str = "",
+    prev_sets: Optional[Dict[str, Dict[str, str]]] = None,
+) -> Tuple[List[Dict[str, Any]], List[str], Dict[str, Any], Dict[str, Dict[str, str]]]:
     """
     Retorna:
       - branch_reports: lista de dicts por branch com stats
       - branches: lista de nomes das branches
+      - unique: contagens exatas do repo (unique_stats + unique_complete)
+      - path_sets: head_sha -> path_sets (só repos com mais de um SHA), para o
+        path_sets_file
+    previous: branch_reports da execução anterior; branches com o mesmo
+    head_sha são reaproveitadas sem buscar a árvore.
+    heads: [(branch, sha)] já conhecidos (GraphQL); senão lista via REST.
+    default_branch: base das stats por delta (AUDIT_BRANCH_DELTA).
+    prev_sets: path_sets da execução anterior; é de onde vêm os das branches
+    reaproveitadas (ou do TREE_CACHE, se estiverem lá). Se não estiverem em
+    lugar nenhum, a árvore é buscada uma vez para calculá-los; só se ela não
+    vier unique_* fica como limite inferior e unique_complete=False.
     """
-    branches = list_branches(owner, repo_name)
-
-    branch_reports: List[Dict[str, Any]] = []
-    for br in branches:
-        sha = get_branch_head_sha(owner, repo_name, br)
+    mirror = None
+    if TREE_BACKEND == "git":
+        try:
+            mirror = MIRRORS.sync(f"{owner}/{repo_name}")
+            heads = MIRRORS.heads(mirror)  # o mirror é a fonte das branches e das árvores
+        except (OSError, subprocess.CalledProcessError) as e:
+            err = e.stderr.decode("utf-8", "replace").strip() if isinstance(e, subprocess.CalledProcessError) else e
+            print(f"[warn] git mirror failed for {owner}/{repo_name}, using the API: {err}")
+            mirror = None
+    if heads is None:
+        heads = list_branch_heads(owner, repo_name)
+    branches = [name for name, _ in heads]
+    prev_by_branch = {b.get("branch"): b for b in (previous or [])}
+    base = None
+    if BRANCH_DELTA and mirror is None:
+        base = delta_base_for(owner, repo_name, heads, default_branch, prev_by_branch)
+    # com um SHA só a união é a própria árvore: path_sets só com dois ou mais
+    shas = {sha for _, sha in heads}
+    need_sets = len(shas) > 1 or (None in shas and len(heads) > 1)
+    path_sets: Dict[str, Optional[Dict[str, str]]] = {}  # head_sha -> path_sets
+
+    def stats_of(sha: str) -> Dict[str, Any]:
+        if mirror is not None:
+            return git_stats_for_sha(mirror, sha, need_sets)
+        return stats_for_sha(owner, repo_name, sha, base, need_sets)
+
+    def one_branch(head: Tuple[str, Optional[str]]) -> Dict[str, Any]:
+        br, sha = head
+        if not sha:
+            sha = get_branch_head_sha(owner, repo_name, br)
+        prev = prev_by_branch.get(br)
+        if sha and _reusable(prev) and prev.get("head_sha") == sha:
+            INCREMENTAL_STATS.branch()
+            return dict(prev)
         if not sha:
-            stats = empty_stats()
+            stats = empty_branch_stats()
         else:
-            tree = get_tree(owner, repo_name, sha) or []
-            stats = analyze_tree(tree)
+            stats = stats_of(sha)
+            path_sets[sha] = stats.pop("path_sets", None)
 
-        branch_reports.append({
+        return {
             "branch": br,
             "head_sha": sha,
             **stats,
-        })
-
-    return branch_reports, branches
-
+        }
+
+    branch_reports = pmap(one_branch, heads, ORG_MAX_INFLIGHT)
+    complete = all(b.get("head_sha") and b.get("tree_complete") for b in branch_reports)
+    if not need_sets:
+        return branch_reports, branches, {**branch_unique_stats(branch_reports), "unique_complete": complete}, {}
+
+    # branches reaproveitadas: path_sets do run anterior ou do TREE_CACHE; a
+    # árvore só é buscada se não estiverem em nenhum dos dois (ex: o repo
+    # tinha um SHA só no run anterior e ganhou uma branch agora)
+    for sha in {b["head_sha"] for b in branch_reports if b.get("head_sha")} - set(path_sets):
+        ps = (prev_sets or {}).get(sha)
+        if ps is None:
+            ps = (TREE_CACHE.peek(sha) or {}).get("path_sets")
+        if ps is None:
+            INCREMENTAL_STATS.refetched()
+            stats = stats_of(sha)
+            ps = stats.get("path_sets") if stats.get("tree_complete") else None
+        path_sets[sha] = ps
+    missing = [sha for sha, ps in path_sets.items() if ps is None]
+
+    unique = unique_stats(ps for ps in path_sets.values() if ps)
+    if missing:
+        # limite inferior: nenhuma branch tem mais arquivos que a união
+        lower = branch_unique_stats(branch_reports, max)
+        unique = {k: max(v, lower[k]) for k, v in unique.items()}
+        print(f"[unique] {owner}/{repo_name}: no path sets for {len(missing)} head(s), "
+              f"unique_* is a lower bound")
+    unique["unique_complete"] = complete and not missing
+    return branch_reports, branches, unique, {sha: ps for sha, ps in path_sets.items() if ps is not None}
+
+
+def branch_unique_stats(branch_reports: List[Dict[str, Any]], pick: Callable = lambda xs: xs[0]) -> Dict[str, int]:
+    """
+    unique_* tirados dos contadores das branches: exatos quando todas apontam
+    pro mesmo SHA (a primeira serve); com pick=max, um limite inferior da união.
+    """
+    bs = branch_reports or [empty_branch_stats()]
+    out = {f"unique_{k}": pick([int(b.get(k, 0)) for b in bs]) for k in BUCKET_KEYS}
+    out["unique_total_files"] = pick([int(b.get("total_files", 0)) for b in bs])
+    return out
 
-def audit_one_org(org: str) -> List[Dict[str, Any]]:
-    print(f"[audit] org={org}")
-    repos = list_org_repos(org)
 
-    rows: List[Dict[str, Any]] = []
-    for repo in repos:
-        name = repo["name"]
-        full_name = repo["full_name"]
-        html_url = repo["html_url"]
-        archived = repo.get("archived", False)
-        fork = repo.get("fork", False)
-        private = repo.get("private", False)
-        default_branch = repo.get("default_branch") or ""
-        pushed_at = repo.get("pushed_at") or ""
+def empty_unique_stats() -> Dict[str, Any]:
+    return {**unique_stats([]), "unique_complete": False}
 
-        owner = repo["owner"]["login"]
 
+def delta_base_for(
+    owner: str,
+    repo_name: str,
+    heads: List[Tuple[str, Optional[str]]],
+    default_branch: str,
+    prev_by_branch: Dict[Optional[str], Dict[str, Any]],
+) -> Optional[DeltaBase]:
+    """
+    DeltaBase da default branch, se compensar: a árvore da default sai de
+    graça quando ela mesma precisa ser calculada; senão só vale a pena com
+    pelo menos duas outras branches a calcular.
+    """
+    base_sha = dict(heads).get(default_branch)
+    if not base_sha:
+        return None
+    pending = set()
+    for br, sha in heads:
+        prev = prev_by_branch.get(br)
+        if sha and not (_reusable(prev) and prev.get("head_sha") == sha) and not TREE_CACHE.has(sha):
+            pending.add(sha)
+    if base_sha in pending or len(pending) >= 2:
+        return DeltaBase(owner, repo_name, base_sha)
+    return None
+
+
+@METRICS.traced("list_repos")
+def list_repos_for_backend(org: str) -> List[Dict[str, Any]]:
+    if BACKEND == "graphql":
         try:
-            branch_reports, branch_names = audit_one_repo(owner, name)
+            return list_org_repos_graphql(org)
         except Exception as e:
-            print(f"[warn] failed branches for {owner}/{name}: {e}")
-            branch_reports, branch_names = [], []
-
-        repo_stats = aggregate_repo_stats(branch_reports)
-
-        rows.append({
-            "org": org,
-            "name": name,
-            "full_name": full_name,
-            "url": html_url,
-            "private": private,
-            "archived": archived,
-            "fork": fork,
-            "default_branch": default_branch,
-            "pushed_at": pushed_at,
-
-            # resumo (para CSV/MD e view atual não quebrar totalmente)
-            **repo_stats,
-
-            # detalhe branch-aware (para view futura)
-            "branches_count": len(branch_names),
-            "branches": branch_reports,
-        })
+            print(f"[warn] graphql failed for org={org}, falling back to REST: {e}")
+    return list_org_repos(org)
 
-    return rows
-
-
-def write_reports_for_org(org: str, rows: List[Dict[str, Any]]) -> None:
-    org_dir = os.path.join(REPORT_DIR, org)
-    os.makedirs(org_dir, exist_ok=True)
-
-    # JSON (para o audit.html consumir)
-    json_path = os.path.join(org_dir, "org-audit.json")
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(rows, f, ensure_ascii=False, indent=2)
-
-    # CSV: não colocamos o objeto "branches" (aninhado) aqui
-    # -> geramos uma versão "flat"
-    csv_rows = []
-    for r in rows:
-        rr = dict(r)
-        rr.pop("branches", None)
-        csv_rows.append(rr)
-
-    csv_path = os.path.join(org_dir, "org-audit.csv")
-    fieldnames = list(csv_rows[0].keys()) if csv_rows else []
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        w.writerows(csv_rows)
-
-    # Markdown summary (usa o agregado por repo)
-    md_path = os.path.join(org_dir, "org-audit.md")
-    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-    total = len(rows)
-    with_readme = sum(1 for r in rows if r["has_readme"])
-    with_gitignore = sum(1 for r in rows if r["has_gitignore"])
-    total_ipynb = sum(int(r["notebooks_ipynb"]) for r in rows)
-
-    lines = []
-    lines.append(f"# Org Audit Report: {org}\n\nGenerated: **{now}**\n\n")
-    lines.append(f"- Repositories: **{total}**\n")
-    lines.append(f"- With README (any branch): **{with_readme}/{total}**\n")
-    lines.append(f"- With .gitignore (any branch): **{with_gitignore}/{total}**\n")
-    lines.append(f"- Total notebooks (.ipynb) (sum over branches): **{total_ipynb}**\n\n")
-
-    lines.append("## Table (top 50)\n\n")
-    lines.append("| Repo | branches | README | .gitignore | ipynb | py | tex | files | updated |\n")
-    lines.append("|---|---:|---:|---:|---:|---:|---:|---:|---|\n")
-    for r in rows[:50]:
-        lines.append(
-            f"| [{r['name']}]({r['url']}) | "
-            f"{r.get('branches_count', 0)} | "
-            f"{'✅' if r['has_readme'] else '—'} | "
-            f"{'✅' if r['has_gitignore'] else '—'} | "
-            f"{r['notebooks_ipynb']} | {r['files_py']} | {r['files_tex']} | "
-            f"{r['total_files']} | {r['pushed_at'][:10]} |\n"
-        )
 
-    with open(md_path, "w", encoding="utf-8") as f:
-        f.writelines(lines)
+def iter_org_rows(org: str, previous: Optional[PreviousRows] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Gera as linhas (uma por repo) conforme ficam prontas, na ordem do
+    list_org_repos. previous: linhas da execução anterior por full_name
+    (modo incremental; PreviousRows ou um dict).
+    """
+    print(f"[audit] org={org} max_inflight={ORG_MAX_INFLIGHT}/{MAX_INFLIGHT}")
+    previous = previous or {}
+    ctx = contextvars.copy_context()
+    ctx.run(_org_slots.set, threading.BoundedSemaphore(ORG_MAX_INFLIGHT))
 
-    print(f"[ok] wrote {json_path}, {csv_path}, {md_path}")
+    repos = ctx.run(list_repos_for_backend, org)
+    yield from pimap(
+        lambda repo: audit_repo_row(org, repo, previous.get(repo["full_name"])),
+        repos,
+        ORG_MAX_INFLIGHT,
+        ctx=ctx,
+    )
 
 
-def main():
-    print(f"[audit] orgs={SLUGS}")
+def audit_one_org(org: str, previous: Optional[PreviousRows] = None) -> List[Dict[str, Any]]:
+    return list(iter_org_rows(org, previous))
 
-    all_rows: List[Dict[str, Any]] = []
-    for slug in SLUGS:
-        try:
-            org = ORG_MAP.get(slug, slug)  # fallback: slug == org real
-            rows = audit_one_org(org)
 
-            # grava em reports/<slug>/... mas mantém "org real" no conteúdo
-            write_reports_for_org(slug, rows)
-            all_rows.extend(rows)
-        except Exception as e:
-            # não derruba tudo se uma org falhar
-            print(f"[error] org={org}: {e}")
+def audit_repo_row(org: str, repo: Dict[str, Any], prev_row: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    name = repo["name"]
+    full_name = repo["full_name"]
+    html_url = repo["html_url"]
+    archived = repo.get("archived", False)
+    fork = repo.get("fork", False)
+    private = repo.get("private", False)
+    default_branch = repo.get("default_branch") or ""
+    pushed_at = repo.get("pushed_at") or ""
+
+    owner = repo["owner"]["login"]
+
+    prev_branches = (prev_row or {}).get("branches") or []
+
+    try:
+        if (
+            prev_row
+            and pushed_at
+            and prev_row.get("pushed_at") == pushed_at
+            and prev_branches  # 0 branches pode ter sido falha: busca de novo
+            and all(_reusable(b) for b in prev_branches)
+            and all(k in prev_row for k in empty_unique_stats())
+        ):
+            # nada foi pushado desde a última execução
+            branch_reports = [dict(b) for b in prev_branches]
+            branch_names = [b.get("branch") for b in branch_reports]
+            unique = {k: prev_row[k] for k in empty_unique_stats()}
+            path_sets = prev_row.get("path_sets") or {}
+            INCREMENTAL_STATS.repo(len(branch_reports))
+        else:
+            branch_reports, branch_names, unique, path_sets = audit_one_repo(
+                owner, name, prev_branches, repo.get("_branch_heads"), default_branch,
+                (prev_row or {}).get("path_sets"),
+            )
+    except Exception as e:
+        print(f"[warn] failed branches for {owner}/{name}: {e}")
+        branch_reports, branch_names, unique, path_sets = [], [], empty_unique_stats(), {}
+
+    repo_stats = aggregate_repo_stats(branch_reports)
+
+    return {
+        "org": org,
+        "name": name,
+        "full_name": full_name,
+        "url": html_url,
+        "private": private,
+        "archived": archived,
+        "fork": fork,
+        "default_branch": default_branch,
+        "pushed_at": pushed_at,
+
+        # resumo (para CSV/MD e view atual não quebrar totalmente)
+        **repo_stats,
+        # arquivos distintos entre todas as branches (união dos paths)
+        **unique,
+
+        # detalhe branch-aware (para view futura)
+        "branches_count": len(branch_names),
+        "branches": branch_reports,
+        # só para o path_sets_file (OrgReportWriter tira da linha)
+        "path_sets": path_sets,
+    }
+
+
+def flat_row(r: Dict[str, Any]) -> Dict[str, Any]:
+    """Linha para CSV: sem o objeto "branches" (aninhado)."""
+    return {k: v for k, v in r.items() if k != "branches"}
+
+
+class OrgReportWriter:
+    """
+    Grava os relatórios de uma org em streaming, linha a linha:
+      - org-audit.ndjson (um repo por linha)
+      - org-audit.json   (array, mesmo formato indent=2, para o audit.html)
+      - org-audit.csv    (flat)
+      - org-audit.md     (totais acumulados + as 50 primeiras linhas)
+      - org-audit.index.json (compacto, um resumo por repo sem "branches";
+        "detail" aponta pro shard do repo)
+      - repos/<name>.<hash>.json (shard com as branches do repo; o hash é do
+        conteúdo, então o nome só muda quando o conteúdo muda e o browser
+        pode manter em cache)
+      - path_sets_file(slug), no cache e fora de reports/ (path_sets por
+        head_sha dos repos com mais de um SHA; o próximo run incremental
+        une as branches reaproveitadas sem buscar as árvores)
+    Escreve em .tmp e só troca pelos arquivos finais no close(); se a org
+    falhar no meio (abort), os relatórios anteriores ficam intactos.
+    """
+
+    MD_TOP = 50
+    SHARD_DIR = "repos"
+
+    def __init__(self, slug: str):
+        self.slug = slug
+        self.org_dir = os.path.join(REPORT_DIR, slug)
+        os.makedirs(self.org_dir, exist_ok=True)
+        self.paths = {ext: os.path.join(self.org_dir, f"org-audit.{ext}") for ext in ("ndjson", "json", "csv", "md", "index.json")}
+        self.shard_dir = os.path.join(self.org_dir, self.SHARD_DIR)
+        self._shards: set = set()       # shards referenciados neste run
+        self._new_shards: List[str] = []  # criados neste run (apagados no abort)
+        self._files = {
+            ext: open(f"{path}.tmp", "w", encoding="utf-8", newline="" if ext == "csv" else None)
+            for ext, path in self.paths.items() if ext != "md"
+        }
+        self.sets_path = path_sets_file(slug)
+        self._sets = None
+        if self.sets_path:
+            os.makedirs(os.path.dirname(self.sets_path), exist_ok=True)
+            self._sets = open(f"{self.sets_path}.tmp", "w", encoding="utf-8")
+        self._csv: Optional[csv.DictWriter] = None
+        self.fieldnames: List[str] = []
+        self.total = 0
+        self.with_readme = 0
+        self.with_gitignore = 0
+        self.total_ipynb = 0
+        self.unique_ipynb = 0
+        self.top: List[Dict[str, Any]] = []
+
+    def add(self, r: Dict[str, Any]) -> None:
+        with METRICS.span("write_report"):
+            self._add(r)
+
+    def _add(self, r: Dict[str, Any]) -> None:
+        path_sets = r.pop("path_sets", None)
+        if path_sets and self._sets is not None:
+            self._sets.write(json.dumps({"full_name": r["full_name"], "path_sets": path_sets}) + "\n")
+        self._files["ndjson"].write(json.dumps(r, ensure_ascii=False) + "\n")
+
+        # mesmo texto que json.dump(rows, indent=2), um elemento por vez
+        item = json.dumps(r, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        self._files["json"].write(("[\n  " if self.total == 0 else ",\n  ") + item)
+
+        flat = flat_row(r)
+        if self._csv is None:
+            self.fieldnames = list(flat.keys())
+            self._csv = csv.DictWriter(self._files["csv"], fieldnames=self.fieldnames)
+            self._csv.writeheader()
+        self._csv.writerow(flat)
+
+        summary = {k: v for k, v in r.items() if k != "branches"}
+        summary["detail"] = self._write_shard(r)
+        self._files["index.json"].write(("[" if self.total == 0 else ",\n")
+                                        + json.dumps(summary, ensure_ascii=False, separators=(",", ":")))
+
+        self.total += 1
+        self.with_readme += 1 if r["has_readme"] else 0
+        self.with_gitignore += 1 if r["has_gitignore"] else 0
+        self.total_ipynb += int(r["notebooks_ipynb"])
+        self.unique_ipynb += int(r.get("unique_notebooks_ipynb", 0))
+        if len(self.top) < self.MD_TOP:
+            self.top.append(flat)
+
+    def _write_shard(self, r: Dict[str, Any]) -> str:
+        """Grava repos/<name>.<hash>.json (se ainda não existir) e devolve o caminho relativo."""
+        shard = {"full_name": r["full_name"], "branches": r.get("branches", [])}
+        data = json.dumps(shard, ensure_ascii=False, separators=(",", ":"))
+        name = "%s.%s.json" % (r["name"], hashlib.sha1(data.encode("utf-8")).hexdigest()[:12])
+        path = os.path.join(self.shard_dir, name)
+        if name not in self._shards and not os.path.exists(path):
+            os.makedirs(self.shard_dir, exist_ok=True)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(data + "\n")
+            os.replace(f"{path}.tmp", path)
+            self._new_shards.append(path)
+        self._shards.add(name)
+        return f"{self.SHARD_DIR}/{name}"
+
+    def _prune_shards(self) -> None:
+        """Remove shards que nenhum repo deste run referencia."""
+        try:
+            names = os.listdir(self.shard_dir)
+        except OSError:
+            return
+        for name in names:
+            if name not in self._shards:
+                try:
+                    os.remove(os.path.join(self.shard_dir, name))
+                except OSError:
+                    pass
+
+    def _markdown(self, org: str) -> List[str]:
+        now = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+        total = self.total
+
+        lines = []
+        lines.append(f"# Org Audit Report: {org}\n\nGenerated: **{now}**\n\n")
+        lines.append(f"- Repositories: **{total}**\n")
+        lines.append(f"- With README (any branch): **{self.with_readme}/{total}**\n")
+        lines.append(f"- With .gitignore (any branch): **{self.with_gitignore}/{total}**\n")
+        lines.append(f"- Total notebooks (.ipynb) (sum over branches): **{self.total_ipynb}**\n")
+        lines.append(f"- Distinct notebooks (.ipynb) (union of branches per repo): **{self.unique_ipynb}**\n\n")
+
+        lines.append("## Table (top 50, distinct files across branches)\n\n")
+        lines.append("| Repo | branches | README | .gitignore | ipynb | py | tex | files | updated |\n")
+        lines.append("|---|---:|---:|---:|---:|---:|---:|---:|---|\n")
+        for r in self.top:
+            # unique_complete=False: a união é um limite inferior
+            ge = "" if r.get("unique_complete", True) else "≥"
+            lines.append(
+                f"| [{r['name']}]({r['url']}) | "
+                f"{r.get('branches_count', 0)} | "
+                f"{'✅' if r['has_readme'] else '—'} | "
+                f"{'✅' if r['has_gitignore'] else '—'} | "
+                f"{ge}{r['unique_notebooks_ipynb']} | {ge}{r['unique_files_py']} | {ge}{r['unique_files_tex']} | "
+                f"{ge}{r['unique_total_files']} | {r['pushed_at'][:10]} |\n"
+            )
+        return lines
+
+    def close(self) -> None:
+        with METRICS.span("write_report"):
+            self._close()
+
+    def _close(self) -> None:
+        self._files["json"].write("\n]" if self.total else "[]")
+        self._files["index.json"].write("]\n" if self.total else "[]\n")
+        if self._csv is None:
+            self._files["csv"].write("\r\n")  # DictWriter sem colunas: cabeçalho vazio
+        for f in self._files.values():
+            f.close()
+
+        with open(f"{self.paths['md']}.tmp", "w", encoding="utf-8") as f:
+            f.writelines(self._markdown(self.slug))
+
+        for path in self.paths.values():
+            os.replace(f"{path}.tmp", path)
+        if self._sets is not None:
+            self._sets.close()
+            os.replace(f"{self.sets_path}.tmp", self.sets_path)
+        self._prune_shards()
+        print(f"[ok] wrote {self.paths['json']}, {self.paths['ndjson']}, {self.paths['csv']}, {self.paths['md']}, "
+              f"{self.paths['index.json']} (+{len(self._new_shards)} new shards, {len(self._shards)} total)")
+
+    def abort(self) -> None:
+        for f in self._files.values():
+            f.close()
+        paths = list(self.paths.values())
+        if self._sets is not None:
+            self._sets.close()
+            paths.append(self.sets_path)
+        for path in paths:
+            try:
+                os.remove(f"{path}.tmp")
+            except OSError:
+                pass
+        for path in self._new_shards:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        for d in (self.shard_dir, self.org_dir):
+            try:
+                os.rmdir(d)  # só remove se ficou vazio
+            except OSError:
+                pass
+
+    def __enter__(self) -> "OrgReportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_reports_for_org(org: str, rows: Iterable[Dict[str, Any]]) -> OrgReportWriter:
+    with OrgReportWriter(org) as w:
+        for r in rows:
+            w.add(r)
+    return w
+
+
+def append_csv_body(src: str, dst: str, write_header: bool) -> None:
+    """Copia o CSV de uma org para o consolidado, sem carregar em memória."""
+    with open(src, "r", encoding="utf-8", newline="") as fin, \
+            open(dst, "a", encoding="utf-8", newline="") as fout:
+        header = fin.readline()
+        if write_header:
+            fout.write(header)
+        for line in fin:
+            fout.write(line)
+
+
+def iter_ndjson(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+@METRICS.traced("history")
+def record_history(slug: str, w: OrgReportWriter) -> None:
+    """Acrescenta o run ao histórico e grava org-audit.diff.json contra o run anterior."""
+    entry = HISTORY.append(slug, iter_ndjson(w.paths["ndjson"]), RUN_AT)
+    diff = HISTORY.diff(slug, new_run=entry["run"])
+    if diff is None:
+        print(f"[history] slug={slug} first run {entry['run']}")
+        return
+    path = os.path.join(REPORT_DIR, slug, "org-audit.diff.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(diff, f, ensure_ascii=False, indent=2)
+    print(f"[history] slug={slug} {diff['from']} -> {diff['to']}: "
+          f"+{len(diff['repos_added'])} -{len(diff['repos_removed'])} repos, "
+          f"{len(diff['archived'])} archived, +{len(diff['branches_added'])} -{len(diff['branches_removed'])} "
+          f"~{len(diff['branches_moved'])} branches, {len(diff['changed'])} repos changed")
+
+
+def audit_slug(slug: str) -> Tuple[OrgRun, Optional[OrgReportWriter]]:
+    """Audita uma org inteira; erros ficam só nela (status no OrgRun)."""
+    org = ORG_MAP.get(slug, slug)  # fallback: slug == org real
+    run = OrgRun(slug, org)
+    _org_run.set(run)
+    METRICS.scope(slug)
+    t0 = time.perf_counter()
+    w: Optional[OrgReportWriter] = None
+    try:
+        previous = PreviousRows(slug) if INCREMENTAL else None
+        if previous:
+            print(f"[incremental] slug={slug} previous repos={len(previous)}")
+
+        # grava em reports/<slug>/... mas mantém "org real" no conteúdo
+        w = write_reports_for_org(slug, iter_org_rows(org, previous))
+        run.status = "ok"
+        run.repos = w.total
+        if HISTORY is not None:
+            try:
+                record_history(slug, w)
+            except Exception as e:
+                # histórico é extra: não invalida o relatório da org
+                print(f"[warn] history failed for slug={slug}: {e}")
+    except Exception as e:
+        # não derruba tudo se uma org falhar
+        print(f"[error] org={org}: {e}")
+        run.status = "error"
+        run.error = str(e)
+        w = None
+    run.duration_s = time.perf_counter() - t0
+    print(f"[audit] org={org} {run.status} in {run.duration_s:.1f}s requests={run.requests}")
+    return run, w
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Auditoria das orgs em ORGS (ver env AUDIT_*).")
+    add_cli_flags(ap)
+    args = ap.parse_args(argv)
+
+    if not ORGS_RAW:
+        raise SystemExit("Missing env ORGS (comma-separated list)")
+    if not TOKEN:
+        raise SystemExit("Missing env GH_TOKEN")
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    METRICS.start(profile=args.profile, trace_memory=args.trace_memory)
+
+    print(f"[audit] orgs={SLUGS} parallel={PARALLEL_ORGS} trees={TREE_BACKEND}")
+
+    # cada org num contexto próprio (limite e contadores não vazam entre orgs)
+    results = pmap(
+        lambda slug: contextvars.copy_context().run(audit_slug, slug),
+        SLUGS,
+        PARALLEL_ORGS,
+    )
+
+    # CSV geral consolidado (flat), na ordem de SLUGS, a partir do CSV de cada org
+    csv_all_path = os.path.join(REPORT_DIR, "org-audit.ALL.csv")
+    csv_all_tmp = f"{csv_all_path}.tmp"
+    all_fieldnames: Optional[List[str]] = None
+    if os.path.exists(csv_all_tmp):
+        os.remove(csv_all_tmp)
+
+    for run, w in results:
+        if w is not None and w.total:
+            append_csv_body(w.paths["csv"], csv_all_tmp, write_header=all_fieldnames is None)
+            all_fieldnames = all_fieldnames or w.fieldnames
 
     # índice geral (útil pro audit.html ter dropdown depois)
     index_path = os.path.join(REPORT_DIR, "index.json")
     with open(index_path, "w", encoding="utf-8") as f:
-        json.dump({"orgs": SLUGS, "generated_at": datetime.utcnow().isoformat() + "Z"}, f, indent=2)
+        json.dump({
+            "orgs": SLUGS,
+            "generated_at": datetime.utcnow().isoformat() + "Z",
+            "runs": {run.slug: run.as_dict() for run, _ in results},
+        }, f, indent=2)
     print(f"[ok] wrote {index_path}")
 
-    # CSV geral consolidado (flat)
-    if all_rows:
-        csv_all_path = os.path.join(REPORT_DIR, "org-audit.ALL.csv")
-
-        csv_all_rows = []
-        for r in all_rows:
-            rr = dict(r)
-            rr.pop("branches", None)
-            csv_all_rows.append(rr)
-
-        fieldnames = list(csv_all_rows[0].keys())
-        with open(csv_all_path, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=fieldnames)
-            w.writeheader()
-            w.writerows(csv_all_rows)
-
+    if all_fieldnames is not None:
+        os.replace(csv_all_tmp, csv_all_path)
         print(f"[ok] wrote {csv_all_path}")
 
+    print(f"[scheduler] {SCHEDULER.summary()}")
+    print(f"[latency] {LATENCY.summary()}")
+    print(f"[tree-cache] {TREE_CACHE.summary()}")
+    print(f"[subtree-cache] {SUBTREE_CACHE.summary()}")
+    print(f"[http-cache] {HTTP_CACHE.summary()}")
+    if INCREMENTAL:
+        print(f"[incremental] {INCREMENTAL_STATS.summary()}")
+    if BRANCH_DELTA:
+        c = METRICS.counters
+        print(f"[delta] branches={c.get('delta.branches', 0)} fallback={c.get('delta.fallback', 0)} "
+              f"paths={c.get('delta.paths', 0)}")
+
+    METRICS.write(
+        os.path.join(REPORT_DIR, "run-metrics.json"),
+        orgs={run.slug: run.as_dict() for run, _ in results},
+        latency_ms={f"p{p}": round(LATENCY.percentile(p) * 1000, 1) for p in (50, 95, 99)},
+        scheduler=dict(SCHEDULER.counters, slept_s=round(SCHEDULER.counters["slept_s"], 1)),
+        caches={
+            "tree": dict(TREE_CACHE.counters),
+            "subtree": dict(SUBTREE_CACHE.counters),
+            "http": dict(HTTP_CACHE.counters),
+        },
+    )
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
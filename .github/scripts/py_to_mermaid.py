@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
+import argparse
 import ast
+import hashlib
+import json
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+# cache: <out_dir>/.py_to_mermaid.cache.json, {arquivo relativo a src: {src, out, mmd}}
+CACHE_NAME = ".py_to_mermaid.cache.json"
+# .mmd escritos neste run, um por linha (o render_all.sh só renderiza estes)
+CHANGED_NAME = ".changed"
+
 # --------- helpers ---------
 def safe(s: str) -> str:
     return (s or "").replace('"', "'")
@@ -152,13 +162,55 @@ def to_mermaid_sequence(title: str, events):
     return "\n".join(lines)
 
 
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# muda quando este script muda: invalida o cache inteiro
+GEN_KEY = sha256(Path(__file__).read_bytes())[:16]
+
+
+def render_file(path: str):
+    """Worker (roda no process pool): (path, mmd, erro)."""
+    p = Path(path)
+    try:
+        code = p.read_text(encoding="utf-8")
+        tree = ast.parse(code, filename=str(p))
+        v = OrchestrationVisitor()
+        v.visit(tree)
+        return path, to_mermaid_sequence(p.name, v.events) + "\n", None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def load_cache(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if data.get("gen") != GEN_KEY:
+        return {}
+    return data.get("files", {})
+
+
+def save_cache(path: Path, files: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"gen": GEN_KEY, "files": files}, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
 def main():
-    if len(sys.argv) != 3:
-        print("usage: py_to_mermaid.py <input_dir_or_file> <out_dir>", file=sys.stderr)
-        sys.exit(2)
+    ap = argparse.ArgumentParser(usage="py_to_mermaid.py <input_dir_or_file> <out_dir> [--jobs N] [--no-cache]")
+    ap.add_argument("src")
+    ap.add_argument("out_dir")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                    help="processos para o ast.parse (default: nº de CPUs; 1 = sem pool)")
+    ap.add_argument("--no-cache", action="store_true", help="ignora o cache e reprocessa tudo")
+    args = ap.parse_args()
 
-    src = Path(sys.argv[1])
-    out_dir = Path(sys.argv[2])
+    t0 = time.perf_counter()
+    src = Path(args.src)
+    out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     files = []
@@ -167,21 +219,93 @@ def main():
     else:
         files = sorted(src.rglob("*.py"))
 
+    cache_path = out_dir / CACHE_NAME
+    previous = load_cache(cache_path)
+    cache = {} if args.no_cache else previous
+    new_cache = {}
+    stats = dict.fromkeys(("files", "parsed", "skipped", "written", "unchanged", "errors", "removed"), 0)
+    stats["files"] = len(files)
+
+    root = src if src.is_dir() else src.parent
+    present = {p.relative_to(root).as_posix() for p in files}
+    todo = []  # (p, hash da fonte)
     for p in files:
+        key = p.relative_to(root).as_posix()
         try:
-            code = p.read_text(encoding="utf-8")
-            tree = ast.parse(code, filename=str(p))
-            v = OrchestrationVisitor()
-            v.visit(tree)
+            src_hash = sha256(p.read_bytes())
+        except OSError as e:
+            print(f"SKIP {p}: {e}", file=sys.stderr)
+            stats["errors"] += 1
+            if key in previous:
+                new_cache[key] = previous[key]  # mantém o último .mmd bom
+            continue
+        out = out_dir / (p.stem + ".mmd")
+        hit = cache.get(key)
+        if hit and hit["src"] == src_hash and hit["out"] == out.name:
+            # fonte igual e saída intocada desde o último run: nem abre o ast
+            try:
+                if sha256(out.read_bytes()) == hit["mmd"]:
+                    new_cache[key] = hit
+                    stats["skipped"] += 1
+                    continue
+            except OSError:
+                pass
+        todo.append((p, src_hash))
 
-            title = p.name
-            mmd = to_mermaid_sequence(title, v.events)
+    jobs = max(1, min(args.jobs, len(todo)))
+    paths = [str(p) for p, _ in todo]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            results = list(ex.map(render_file, paths, chunksize=max(1, len(paths) // (jobs * 4))))
+    else:
+        results = [render_file(x) for x in paths]
 
-            out = out_dir / (p.stem + ".mmd")
-            out.write_text(mmd + "\n", encoding="utf-8")
+    changed = []
+    for (p, src_hash), (_, mmd, err) in zip(todo, results):
+        stats["parsed"] += 1
+        if err is not None:
+            print(f"SKIP {p}: {err}", file=sys.stderr)
+            stats["errors"] += 1
+            key = p.relative_to(root).as_posix()
+            if key in previous:
+                new_cache[key] = previous[key]  # mantém o último .mmd bom
+            continue
+        out = out_dir / (p.stem + ".mmd")
+        data = mmd.encode("utf-8")
+        try:
+            same = out.read_bytes() == data
+        except OSError:
+            same = False
+        if same:
+            # conteúdo igual: não reescreve (mtime intacto, nada a re-renderizar)
+            stats["unchanged"] += 1
+        else:
+            out.write_bytes(data)
+            stats["written"] += 1
+            changed.append(out.name)
             print(f"WROTE {out}")
-        except Exception as e:
-            print(f"SKIP {p}: {e}", file=sys.stderr)
+        new_cache[p.relative_to(root).as_posix()] = {"src": src_hash, "out": out.name, "mmd": sha256(data)}
+
+    # fonte que sumiu: remove o .mmd que este script tinha gerado (o .svg
+    # sai no render_all.sh); com SKIP o último .mmd bom fica
+    kept = {e["out"] for e in new_cache.values()}
+    for key, entry in previous.items():
+        if key not in present and entry["out"] not in kept:
+            try:
+                (out_dir / entry["out"]).unlink()
+                stats["removed"] += 1
+                print(f"REMOVED {out_dir / entry['out']}")
+            except OSError:
+                pass
+
+    if not args.no_cache:
+        save_cache(cache_path, new_cache)
+    (out_dir / CHANGED_NAME).write_text("".join(name + "\n" for name in changed), encoding="utf-8")
+
+    dt = time.perf_counter() - t0
+    print("[py_to_mermaid] " + " ".join(f"{k}={v}" for k, v in stats.items()) + f" jobs={jobs} time={dt:.2f}s",
+          file=sys.stderr)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
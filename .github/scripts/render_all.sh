@@ -13,14 +13,9 @@ OUT_MMD_PY="$ROOT/assets/mmd/scripts"
 OUT_SVG_WF="$ROOT/assets/svg/workflows"
 OUT_SVG_PY="$ROOT/assets/svg/scripts"
 
-# Temporários
-TMP_WF="$ROOT/.tmp/workflows"
-TMP_PY="$ROOT/.tmp/scripts"
-
 mkdir -p \
   "$OUT_MMD_WF" "$OUT_MMD_PY" \
-  "$OUT_SVG_WF" "$OUT_SVG_PY" \
-  "$TMP_WF" "$TMP_PY"
+  "$OUT_SVG_WF" "$OUT_SVG_PY"
 
 # deps: node + mermaid-cli + python3 + pyyaml
 if [ ! -d "$ROOT/node_modules/@mermaid-js/mermaid-cli" ]; then
@@ -35,42 +30,61 @@ PY
 MMDC="$ROOT/node_modules/.bin/mmdc"
 PUPPET="$ROOT/.github/scripts/puppeteer-no-sandbox.json"
 
+# RENDER_ALL=1 renderiza tudo; senão só os .mmd listados em <dir>/.changed
+# (escritos pelos geradores neste run) e os que ainda não têm .svg
+RENDER_ALL="${RENDER_ALL:-0}"
+
+# render_changed <mmd_dir> <svg_dir> <label>
+render_changed() {
+  local mmd_dir="$1" svg_dir="$2" label="$3"
+  local changed="$mmd_dir/.changed"
+  local rendered=0 skipped=0
+
+  for mmd in "$mmd_dir"/*.mmd; do
+    [ -f "$mmd" ] || continue
+    base="$(basename "$mmd" .mmd)"
+    svg="$svg_dir/${base}.svg"
+
+    if [ "$RENDER_ALL" != "1" ] && [ -f "$svg" ] \
+      && ! { [ -f "$changed" ] && grep -qxF "${base}.mmd" "$changed"; }; then
+      skipped=$((skipped + 1))
+      continue
+    fi
+
+    "$MMDC" \
+      -i "$mmd" \
+      -o "$svg" \
+      -b transparent \
+      --puppeteerConfigFile "$PUPPET"
+
+    rendered=$((rendered + 1))
+    echo "OK ($label): $svg"
+  done
+
+  # .svg cujo .mmd o gerador removeu (fonte apagada)
+  local removed=0
+  for svg in "$svg_dir"/*.svg; do
+    [ -f "$svg" ] || continue
+    base="$(basename "$svg" .svg)"
+    if [ ! -f "$mmd_dir/${base}.mmd" ]; then
+      rm -f "$svg"
+      removed=$((removed + 1))
+      echo "REMOVED ($label): $svg"
+    fi
+  done
+
+  echo "[render] $label rendered=$rendered skipped=$skipped removed=$removed"
+}
+
 # =================================
 # WORKFLOWS (.yml) -> .mmd -> .svg
 # =================================
-python3 "$ROOT/.github/scripts/workflow_to_mermaid.py" "$WF_DIR" "$TMP_WF"
-
-for mmd in "$TMP_WF"/*.mmd; do
-  [ -f "$mmd" ] || continue
-  base="$(basename "$mmd" .mmd)"
-
-  cp "$mmd" "$OUT_MMD_WF/${base}.mmd"
-
-  "$MMDC" \
-    -i "$mmd" \
-    -o "$OUT_SVG_WF/${base}.svg" \
-    -b transparent \
-    --puppeteerConfigFile "$PUPPET"
-
-  echo "OK (workflow): $OUT_SVG_WF/${base}.svg"
-done
+# gera direto em assets/mmd (o manifest fica lá e vai junto no commit)
+python3 "$ROOT/.github/scripts/workflow_to_mermaid.py" "$WF_DIR" "$OUT_MMD_WF"
+render_changed "$OUT_MMD_WF" "$OUT_SVG_WF" "workflow"
 
 # =================================
 # SCRIPTS (.py) -> .mmd -> .svg
 # =================================
-python3 "$ROOT/.github/scripts/py_to_mermaid.py" "$PY_DIR" "$TMP_PY"
-
-for mmd in "$TMP_PY"/*.mmd; do
-  [ -f "$mmd" ] || continue
-  base="$(basename "$mmd" .mmd)"
-
-  cp "$mmd" "$OUT_MMD_PY/${base}.mmd"
-
-  "$MMDC" \
-    -i "$mmd" \
-    -o "$OUT_SVG_PY/${base}.svg" \
-    -b transparent \
-    --puppeteerConfigFile "$PUPPET"
-
-  echo "OK (script): $OUT_SVG_PY/${base}.svg"
-done
\ No newline at end of file
+python3 "$ROOT/.github/scripts/py_to_mermaid.py" "$PY_DIR" "$OUT_MMD_PY"
+render_changed "$OUT_MMD_PY" "$OUT_SVG_PY" "script"
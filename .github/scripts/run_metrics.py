@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Spans por fase e reports/run-metrics.json, usados pelo org_audit.py e pelo ga_audit_usage.py.
+
+  METRICS = RunMetrics("org_audit")
+
+  with METRICS.span("get_tree"):          # tempo/contagem/erros por nome (thread-safe)
+      ...
+  @METRICS.traced("list_repos")           # idem, como decorator
+  METRICS.add("sleep.rate_limit", secs)   # tempo medido por fora
+  METRICS.count("http.status.304")
+  METRICS.scope(slug)                     # contextvar: spans também somados por org
+
+Spans em threads paralelas somam o tempo de cada thread, então o total_s de
+uma fase pode passar do duration_s do run; spans aninhados (http.* dentro de
+get_tree) contam nos dois.
+
+Cada run acrescenta uma entrada em run-metrics.json ({"runs": [...]}, só as
+RUN_METRICS_KEEP mais recentes), com "script" e "started_at" pro dashboard
+montar a série por script.
+
+  --profile       cProfile em todas as threads: <dir>/run-profile.<script>.prof + top 25 na entrada
+  --trace-memory  tracemalloc: pico e top 10 linhas que mais alocaram
+
+  python .github/scripts/run_metrics.py show  [reports/run-metrics.json] [--script org_audit]
+  python .github/scripts/run_metrics.py merge OUT IN [IN ...]
+"""
+import argparse
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource  # só Unix: pico de RSS
+except ImportError:
+    resource = None
+
+RUN_METRICS_KEEP = int(os.environ.get("RUN_METRICS_KEEP", "200"))
+PROFILE_TOP = 25
+MEMORY_TOP = 10
+
+_scope: contextvars.ContextVar[str] = contextvars.ContextVar("run_metrics_scope", default="")
+
+
+def _span_dict(s: List[float]) -> Dict[str, Any]:
+    count, total, peak, errors = s
+    d = {"count": int(count), "total_s": round(total, 3), "max_s": round(peak, 3),
+         "avg_ms": round(total / count * 1000, 2) if count else 0.0}
+    if errors:
+        d["errors"] = int(errors)
+    return d
+
+
+class RunMetrics:
+    """Acumula spans e contadores de um run e grava a entrada no run-metrics.json."""
+
+    def __init__(self, script: str):
+        self.script = script
+        self._lock = threading.Lock()
+        self._spans: Dict[Tuple[str, str], List[float]] = {}  # (scope, nome) -> [count, total, max, errors]
+        self.counters: Dict[str, float] = {}
+        self.started_at = datetime.utcnow()
+        self._t0 = time.perf_counter()
+        self._profiles: List[cProfile.Profile] = []
+        self._profiling = False
+        self._tracing = False
+
+    # ---- coleta ----
+
+    def add(self, name: str, seconds: float, error: bool = False) -> None:
+        scope = _scope.get()
+        keys = (("", name), (scope, name)) if scope else (("", name),)
+        with self._lock:
+            for key in keys:
+                s = self._spans.get(key)
+                if s is None:
+                    s = self._spans[key] = [0, 0.0, 0.0, 0]
+                s[0] += 1
+                s[1] += seconds
+                s[2] = max(s[2], seconds)
+                s[3] += 1 if error else 0
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.add(name, time.perf_counter() - t0, error)
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """Decorator: cada chamada vira um span (default: nome da função)."""
+        def deco(fn: Callable) -> Callable:
+            label = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def count(self, name: str, n: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @staticmethod
+    def scope(label: str) -> None:
+        """Spans seguintes deste contexto também vão para scopes[label]."""
+        _scope.set(label)
+
+    # ---- profile / tracemalloc ----
+
+    def start(self, profile: bool = False, trace_memory: bool = False) -> None:
+        """Zera o relógio do run e liga os modos opcionais."""
+        self.started_at = datetime.utcnow()
+        self._t0 = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        if profile:
+            self._profiling = True
+            self._new_profile()
+            # threads criadas depois disto ganham um Profile próprio
+            threading.setprofile(self._thread_hook)
+
+    def _new_profile(self) -> None:
+        p = cProfile.Profile()
+        try:
+            p.enable()
+        except ValueError:
+            # Python >= 3.12: um profiler por processo; fica só o da thread principal
+            return
+        with self._lock:
+            self._profiles.append(p)
+
+    def _thread_hook(self, *_: Any) -> None:
+        self._new_profile()
+
+    def _stop_profile(self, out_dir: str) -> Optional[Dict[str, Any]]:
+        if not self._profiling:
+            return None
+        threading.setprofile(None)
+        self._profiling = False
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        for p in profiles:
+            p.disable()
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for p in profiles[1:]:
+            stats.add(p)
+        path = os.path.join(out_dir, f"run-profile.{self.script}.prof")
+        stats.dump_stats(path)
+        top = []
+        for (file, line, func), (_, ncalls, tottime, cumtime, _) in \
+                sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:PROFILE_TOP]:
+            top.append({"func": f"{os.path.basename(file)}:{line}({func})", "ncalls": ncalls,
+                        "tottime_s": round(tottime, 3), "cumtime_s": round(cumtime, 3)})
+        print(f"[metrics] wrote {path} ({len(profiles)} threads profiled)")
+        return {"file": os.path.basename(path), "threads": len(profiles), "top": top}
+
+    def _stop_memory(self) -> Optional[Dict[str, Any]]:
+        if not self._tracing:
+            return None
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self._tracing = False
+        top = [{"where": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                "size_kb": round(s.size / 1024, 1), "count": s.count}
+               for s in snapshot.statistics("lineno")[:MEMORY_TOP]]
+        return {"current_mb": round(current / 2**20, 1), "peak_mb": round(peak / 2**20, 1), "top": top}
+
+    # ---- saída ----
+
+    def report(self, out_dir: str = ".", **extra: Any) -> Dict[str, Any]:
+        """Fecha o run (profile/tracemalloc) e devolve a entrada do run-metrics.json."""
+        duration = time.perf_counter() - self._t0
+        with self._lock:
+            spans = {name: _span_dict(s) for (scope, name), s in sorted(self._spans.items()) if not scope}
+            scopes: Dict[str, Dict[str, Any]] = {}
+            for (scope, name), s in sorted(self._spans.items()):
+                if scope:
+                    scopes.setdefault(scope, {})[name] = _span_dict(s)
+            counters = {k: round(v, 3) if isinstance(v, float) else v for k, v in sorted(self.counters.items())}
+
+        entry: Dict[str, Any] = {
+            "script": self.script,
+            "started_at": self.started_at.isoformat(timespec="milliseconds") + "Z",
+            "duration_s": round(duration, 3),
+            "spans": spans,
+            "scopes": scopes,
+            "counters": counters,
+        }
+        if resource is not None:
+            entry["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # Linux: KB
+        memory = self._stop_memory()
+        if memory:
+            entry["memory"] = memory
+        profile = self._stop_profile(out_dir)
+        if profile:
+            entry["profile"] = profile
+        entry.update(extra)
+        return entry
+
+    def write(self, path: str, **extra: Any) -> Dict[str, Any]:
+        """Acrescenta a entrada deste run em path (mantém as RUN_METRICS_KEEP mais recentes)."""
+        out_dir = os.path.dirname(path) or "."
+        os.makedirs(out_dir, exist_ok=True)
+        entry = self.report(out_dir, **extra)
+        save_runs(path, load_runs(path) + [entry])
+        print(f"[metrics] wrote {path} ({self.script} {entry['duration_s']:.1f}s, {len(entry['spans'])} spans)")
+        return entry
+
+
+def load_runs(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("runs", [])
+    except (OSError, ValueError, AttributeError):
+        return []
+
+
+def save_runs(path: str, runs: List[Dict[str, Any]]) -> None:
+    # uma entrada por (script, started_at): o mesmo arquivo pode vir de vários artifacts
+    by_key = {(r.get("script"), r.get("started_at")): r for r in runs}
+    runs = sorted(by_key.values(), key=lambda r: r.get("started_at") or "")[-RUN_METRICS_KEEP:]
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"generated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z", "runs": runs},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def add_cli_flags(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--profile", action="store_true", help="cProfile em todas as threads (.prof ao lado do run-metrics.json)")
+    ap.add_argument("--trace-memory", action="store_true", help="tracemalloc: pico e maiores alocações")
+
+
+def cmd_show(args) -> None:
+    runs = [r for r in load_runs(args.path) if not args.script or r.get("script") == args.script]
+    for r in runs[-args.last:]:
+        spans = sorted(r.get("spans", {}).items(), key=lambda kv: kv[1]["total_s"], reverse=True)
+        top = ", ".join(f"{k}={v['total_s']:.1f}s/{v['count']}" for k, v in spans[:5])
+        print(f"{r['started_at']}  {r['script']:<16} {r['duration_s']:8.1f}s  {top}")
+
+
+def cmd_merge(args) -> None:
+    runs: List[Dict[str, Any]] = []
+    for path in [args.out] + args.inputs:
+        runs += load_runs(path)
+    save_runs(args.out, runs)
+    print(f"[metrics] merged {len(args.inputs)} file(s) into {args.out}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("show", help="resumo dos últimos runs")
+    p.add_argument("path", nargs="?", default=os.path.join("reports", "run-metrics.json"))
+    p.add_argument("--script")
+    p.add_argument("--last", type=int, default=20)
+    p.set_defaults(fn=cmd_show)
+
+    p = sub.add_parser("merge", help="junta run-metrics.json de vários artifacts")
+    p.add_argument("out")
+    p.add_argument("inputs", nargs="+")
+    p.set_defaults(fn=cmd_merge)
+
+    args = ap.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,25 @@
 #!/usr/bin/env python3
-import sys, os, glob
+import sys, os, glob, hashlib, json, pickle
+from pathlib import Path
 import yaml
 
+# LibYAML (C) quando o PyYAML foi compilado com ela; senão o loader em Python puro
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# documentos já parseados, por hash do arquivo (pickle: preserva a chave True do "on:")
+# WF_PARSE_CACHE="" desliga o cache em disco (o de memória continua); o default
+# fica na raiz do repo (.cache/ no .gitignore), de qualquer cwd
+REPO_ROOT = Path(__file__).resolve().parents[2]
+PARSE_CACHE_DIR = os.environ.get("WF_PARSE_CACHE", str(REPO_ROOT / ".cache" / "workflow_to_mermaid")).strip()
+
+# manifest: <out_dir>/.workflow_to_mermaid.manifest.json, {workflow: {src, out, mmd}} (hashes)
+MANIFEST_NAME = ".workflow_to_mermaid.manifest.json"
+# .mmd escritos neste run, um por linha (o render_all.sh só renderiza estes)
+CHANGED_NAME = ".changed"
+
 def safe(s: str) -> str:
     return (s or "").replace('"', "'")
 
@@ -98,6 +116,71 @@ def emit_sequence(workflow_name, on_block, jobs):
     lines.append("GH-->>Dev: workflow finished (success/fail)")
     return "\n".join(lines)
 
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+# muda quando este script muda: invalida o manifest
+GEN_KEY = sha256(Path(__file__).read_bytes())[:16]
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get("files", {}) if data.get("gen") == GEN_KEY else {}
+
+def save_manifest(path, files):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"gen": GEN_KEY, "files": files}, f, indent=1, sort_keys=True)
+        f.write("\n")
+    os.replace(path + ".tmp", path)
+
+def file_hash(path):
+    try:
+        with open(path, "rb") as f:
+            return sha256(f.read())
+    except OSError:
+        return None
+
+_parsed = {}
+
+def parse_yaml(raw: bytes, cache_dir=None):
+    """yaml.load(raw) com SafeLoader (C se houver), cacheado pelo hash do conteúdo."""
+    cache_dir = PARSE_CACHE_DIR if cache_dir is None else cache_dir
+    key = sha256(raw)
+    if key in _parsed:
+        return _parsed[key]
+
+    path = os.path.join(cache_dir, key[:2], key + ".pickle") if cache_dir else None
+    if path:
+        try:
+            with open(path, "rb") as f:
+                _parsed[key] = pickle.load(f)
+            return _parsed[key]
+        except Exception:
+            # truncado, de outra versão do Python/yaml (AttributeError, ImportError,
+            # ValueError...): faz o parse de novo e regrava por cima
+            pass
+
+    data = yaml.load(raw, Loader=SafeLoader)
+    _parsed[key] = data
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+    return data
+
+def render_workflow(path, raw: bytes) -> str:
+    data = parse_yaml(raw) or {}
+
+    name = data.get("name") or os.path.basename(path)
+    on_block = data.get("on") or data.get(True) or {}  # GH sometimes serializes weirdly
+    jobs = data.get("jobs") or {}
+
+    return emit_sequence(name, on_block, jobs) + "\n"
+
 def main():
     if len(sys.argv) != 3:
         print("usage: workflow_to_mermaid.py <workflow_dir> <out_dir>", file=sys.stderr)
@@ -106,20 +189,51 @@ def main():
     wf_dir, out_dir = sys.argv[1], sys.argv[2]
     os.makedirs(out_dir, exist_ok=True)
 
-    for path in sorted(glob.glob(os.path.join(wf_dir, "*.yml")) + glob.glob(os.path.join(wf_dir, "*.yaml"))):
-        with open(path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    new_manifest = {}
+    changed = []
+    skipped = 0
 
-        name = data.get("name") or os.path.basename(path)
-        on_block = data.get("on") or data.get(True) or {}  # GH sometimes serializes weirdly
-        jobs = data.get("jobs") or {}
+    for path in sorted(glob.glob(os.path.join(wf_dir, "*.yml")) + glob.glob(os.path.join(wf_dir, "*.yaml"))):
+        key = os.path.basename(path)
+        with open(path, "rb") as f:
+            raw = f.read()
+        src_hash = sha256(raw)
 
-        mmd = emit_sequence(name, on_block, jobs)
-        base = os.path.splitext(os.path.basename(path))[0]
+        base = os.path.splitext(key)[0]
         out = os.path.join(out_dir, f"{base}.mmd")
-        with open(out, "w", encoding="utf-8") as g:
-            g.write(mmd + "\n")
-        print(f"WROTE {out}")
+
+        entry = manifest.get(key)
+        if entry and entry["src"] == src_hash and entry["mmd"] == file_hash(out):
+            # entrada igual e saída intocada: nem faz o parse do YAML
+            new_manifest[key] = entry
+            skipped += 1
+            continue
+
+        data = render_workflow(path, raw).encode("utf-8")
+        mmd_hash = sha256(data)
+        if file_hash(out) != mmd_hash:
+            with open(out, "wb") as g:
+                g.write(data)
+            changed.append(os.path.basename(out))
+            print(f"WROTE {out}")
+        new_manifest[key] = {"src": src_hash, "out": os.path.basename(out), "mmd": mmd_hash}
+
+    # workflows que sumiram: remove o .mmd que este script tinha gerado
+    kept = {e["out"] for e in new_manifest.values()}
+    for key, entry in manifest.items():
+        if key not in new_manifest and entry["out"] not in kept:
+            try:
+                os.remove(os.path.join(out_dir, entry["out"]))
+                print(f"REMOVED {os.path.join(out_dir, entry['out'])}")
+            except OSError:
+                pass
+
+    save_manifest(manifest_path, new_manifest)
+    with open(os.path.join(out_dir, CHANGED_NAME), "w", encoding="utf-8") as f:
+        f.writelines(name + "\n" for name in changed)
+    print(f"[workflow_to_mermaid] files={len(new_manifest)} skipped={skipped} changed={len(changed)}", file=sys.stderr)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()